@@ -0,0 +1,352 @@
+from categories.bulk import (
+    bulk_create_similarities,
+    bulk_delete_categories,
+    bulk_delete_similarities,
+    bulk_insert_categories,
+    bulk_update_categories,
+    bulk_update_similarities,
+    get_image_renditions,
+    get_missing_images,
+    render_images,
+)
+from categories.images import run_in_background
+from categories.models import Category, Similarity, release_category_image
+from categories.validators import check_category_description, clean_category_name, get_name_errors, get_pair_errors
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+
+BATCH_MAX_SIZE = 1000
+
+
+def get_id(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return None
+
+
+def get_rows(queryset, ids, fields, batch_size=500):
+    """
+    Return {id: row} for the given ids, read in `id__in` batches
+    """
+    ids = list(ids)
+    rows = {}
+    for i in range(0, len(ids), batch_size):
+        batch = queryset.filter(id__in=ids[i:i + batch_size]).order_by().values_list('id', *fields)
+        rows.update((it[0], it) for it in batch)
+    return rows
+
+
+class Batch:
+    """
+    Validate the items of one bulk create ( POST ), update ( PATCH ) or
+    delete ( DELETE ) request with a fixed number of queries and write them
+    all together - or none of them
+
+    Items are validated in full before anything is written: `errors` maps
+    the index of every invalid item to its {field: [messages]}.
+    """
+    item_fields = []
+
+    def __init__(self, method, data):
+        self.method = method
+        self.data = data
+        self.ids = {}
+        self.errors = {}
+
+    def add_error(self, index, field, message):
+        self.errors.setdefault(index, {}).setdefault(field, []).append(message)
+
+    def is_valid(self):
+        if not isinstance(self.data, list) or not self.data:
+            raise ValidationError({'non_field_errors': ['Expected a non-empty list of items.']})
+        if len(self.data) > BATCH_MAX_SIZE:
+            raise ValidationError({'non_field_errors': [f'Expected at most {BATCH_MAX_SIZE} items.']})
+
+        if self.method == 'DELETE':
+            self.ids = self.parse_ids(self.data)
+            self.validate_delete()
+        else:
+            self.items = [self.parse_item(index, item) for index, item in enumerate(self.data)]
+            if self.method == 'PATCH':
+                self.ids = self.parse_ids([it.get('id') for it in self.items])
+            self.validate()
+        return not self.errors
+
+    def parse_item(self, index, item):
+        if not isinstance(item, dict):
+            self.add_error(index, 'non_field_errors', 'Expected an object.')
+            return {}
+        unknown = set(item) - set(self.item_fields) - {'id'}
+        for field in sorted(unknown):
+            self.add_error(index, field, 'Unknown field.')
+        missing = [] if self.method == 'PATCH' else [it for it in self.item_fields if it not in item]
+        for field in missing:
+            self.add_error(index, field, 'This field is required.')
+        return {it: item[it] for it in item if it not in unknown}
+
+    def parse_ids(self, values):
+        ids = {}
+        for index, value in enumerate(values):
+            pk = get_id(value)
+            if pk is None:
+                self.add_error(index, 'id', 'A valid integer is required.')
+            elif pk in ids.values():
+                self.add_error(index, 'id', 'Duplicate id.')
+            else:
+                ids[index] = pk
+        return ids
+
+    @property
+    def results(self):
+        return [{'index': index, 'errors': self.errors[index]} for index in sorted(self.errors)]
+
+
+class CategoryBatch(Batch):
+    """
+    Items are {name, description, parent, image_ref} - `parent` is a
+    category id ( the Root node when left out on create ) and `image_ref`
+    the name of an already stored image, e.g. a category's `image`
+    """
+    item_fields = ['name', 'description', 'parent', 'image_ref']
+
+    def parse_item(self, index, item):
+        if isinstance(item, dict) and self.method == 'POST':
+            item = {'parent': None, **item}
+        item = super().parse_item(index, item)
+
+        if 'name' in item:
+            try:
+                item['name'] = clean_category_name(item['name'])
+            except DjangoValidationError as error:
+                self.add_error(index, 'name', error.messages[0])
+        if 'description' in item:
+            item['description'] = str(item['description'] or '')
+            try:
+                check_category_description(item['description'])
+            except DjangoValidationError as error:
+                self.add_error(index, 'description', error.messages[0])
+        if item.get('parent') is not None:
+            item['parent'] = get_id(item['parent'])
+            if item['parent'] is None:
+                self.add_error(index, 'parent', 'A valid integer is required.')
+        if 'image_ref' in item and not isinstance(item['image_ref'], str):
+            self.add_error(index, 'image_ref', 'A valid string is required.')
+            item['image_ref'] = None
+        elif 'image_ref' in item and not item['image_ref']:
+            self.add_error(index, 'image_ref', 'This field may not be blank.')
+        return item
+
+    def validate(self):
+        self.root_node = Category.objects.get_root()
+        if self.root_node is None:
+            raise ValidationError({'non_field_errors': ['Create the Root category first.']})
+        for item in self.items:
+            if 'parent' in item and item['parent'] is None:
+                item['parent'] = self.root_node.id
+
+        self.categories = {}
+        if self.method == 'PATCH':
+            self.categories = Category.objects.in_bulk(self.ids.values())
+            for index, pk in self.ids.items():
+                if pk not in self.categories:
+                    self.add_error(index, 'id', 'Unknown category.')
+                elif self.categories[pk].is_root:
+                    self.add_error(index, 'id', 'The Root category cannot be changed.')
+
+        self.check_slugs()
+        self.check_images()
+        self.check_parents()
+
+    def check_slugs(self):
+        names = {
+            index: item['name'] for index, item in enumerate(self.items)
+            if 'name' in item and 'name' not in self.errors.get(index, {})
+        }
+        for index, message in get_name_errors(names, self.ids).items():
+            self.add_error(index, 'name', message)
+
+    def check_images(self):
+        names = {item['image_ref'] for item in self.items if item.get('image_ref')}
+        missing = get_missing_images(names)
+        for index, item in enumerate(self.items):
+            if item.get('image_ref') in missing:
+                self.add_error(index, 'image_ref', f'The image "{item["image_ref"]}" is not stored.')
+
+    def check_parents(self):
+        parents = {it['parent'] for it in self.items if it.get('parent') is not None}
+        paths = {pk: path for pk, path in get_rows(Category.objects, parents, ['path']).values()}
+        for index, item in enumerate(self.items):
+            if 'parent' in item and item['parent'] not in paths:
+                self.add_error(index, 'parent', 'Unknown category.')
+        if self.method == 'PATCH':
+            self.check_moves(paths)
+
+    def check_moves(self, paths):
+        """
+        Follow the parents every moved category ends up with: a category
+        reached again from its own new parent would be cut from the tree
+        """
+        self.moved = {}
+        for index, item in enumerate(self.items):
+            category = self.categories.get(self.ids.get(index))
+            if category and item.get('parent') in paths and item['parent'] != category.parent_id:
+                self.moved[category.id] = item['parent']
+
+        for index, item in enumerate(self.items):
+            pk = self.ids.get(index)
+            if pk not in self.moved:
+                continue
+            node, seen = self.moved[pk], set()
+            while node is not None and node != pk and node not in seen:
+                seen.add(node)
+                if node in self.moved:
+                    node = self.moved[node]
+                    continue
+                ancestors = [int(it) for it in paths[node].strip('/').split('/')[:-1]]
+                node = next((it for it in reversed(ancestors) if it == pk or it in self.moved), None)
+            if node is not None:
+                self.add_error(index, 'parent', Category.MOVE_ERROR)
+
+    def validate_delete(self):
+        categories = get_rows(Category.objects, self.ids.values(), ['is_root'])
+        for index, pk in self.ids.items():
+            if pk not in categories:
+                self.add_error(index, 'id', 'Unknown category.')
+            elif categories[pk][1]:
+                self.add_error(index, 'id', 'The Root category cannot be deleted.')
+
+    def save(self):
+        if self.method == 'POST':
+            return self.create()
+        if self.method == 'PATCH':
+            return self.update()
+        bulk_delete_categories(self.ids.values())
+        return [{'index': index, 'id': pk} for index, pk in self.ids.items()]
+
+    def create(self):
+        renditions = get_image_renditions({it['image_ref'] for it in self.items})
+        categories = [
+            Category(
+                name=item['name'],
+                description=item['description'],
+                image=item['image_ref'],
+                renditions=renditions.get(item['image_ref']) or {},
+                parent_id=item['parent'],
+            )
+            for item in self.items
+        ]
+        bulk_insert_categories(categories, [None] * len(categories))
+        self.render_missing(renditions)
+        return [{'index': index, 'id': category.id} for index, category in enumerate(categories)]
+
+    def update(self):
+        renditions = get_image_renditions({it['image_ref'] for it in self.items if 'image_ref' in it})
+        fields = set()
+        categories = []
+        for index, item in enumerate(self.items):
+            category = self.categories[self.ids[index]]
+            if 'name' in item:
+                category.name = item['name']
+            if 'description' in item:
+                category.description = item['description']
+            if 'parent' in item:
+                category.parent_id = item['parent']
+            if 'image_ref' in item and item['image_ref'] != category.image.name:
+                release_category_image(category.image.name, category.renditions)
+                category.image = item['image_ref']
+                category.renditions = renditions.get(item['image_ref']) or {}
+                fields.update(['image', 'renditions'])
+            fields.update(it for it in ['name', 'description', 'parent'] if it in item)
+            categories.append(category)
+
+        bulk_update_categories(categories, sorted(fields), self.moved)
+        self.render_missing(renditions)
+        return [{'index': index, 'id': pk} for index, pk in self.ids.items()]
+
+    def render_missing(self, renditions):
+        missing = {it['image_ref'] for it in self.items if 'image_ref' in it} - set(renditions)
+        if missing:
+            transaction.on_commit(lambda: run_in_background(render_images, sorted(missing)))
+
+
+class SimilarityBatch(Batch):
+    """
+    Items are {node_one, node_two} category ids - duplicate and mirror pairs
+    are looked up for the whole batch in one query on the `pair` key
+    """
+    item_fields = ['node_one', 'node_two']
+
+    def parse_item(self, index, item):
+        item = super().parse_item(index, item)
+        for field in self.item_fields:
+            if field in item:
+                item[field] = get_id(item[field])
+                if item[field] is None:
+                    self.add_error(index, field, 'A valid integer is required.')
+        return item
+
+    def validate(self):
+        self.similarities = {}
+        if self.method == 'PATCH':
+            self.similarities = Similarity.objects.in_bulk(self.ids.values())
+            for index, pk in self.ids.items():
+                if pk not in self.similarities:
+                    self.add_error(index, 'id', 'Unknown similarity.')
+                    continue
+                similarity = self.similarities[pk]
+                self.items[index].setdefault('node_one', similarity.node_one_id)
+                self.items[index].setdefault('node_two', similarity.node_two_id)
+
+        nodes = {it.get(field) for it in self.items for field in self.item_fields} - {None}
+        nodes = get_rows(Category.objects, nodes, ['is_root'])
+        for index, item in enumerate(self.items):
+            for field in self.item_fields:
+                if item.get(field) is None:
+                    continue
+                if item[field] not in nodes:
+                    self.add_error(index, field, 'Unknown category.')
+                elif nodes[item[field]][1]:
+                    self.add_error(index, field, 'The Root category cannot be a node.')
+
+        self.check_pairs()
+
+    def check_pairs(self):
+        pairs = {
+            index: (item['node_one'], item['node_two']) for index, item in enumerate(self.items)
+            if index not in self.errors
+        }
+        for index, message in get_pair_errors(pairs, self.ids).items():
+            self.add_error(index, 'non_field_errors', message)
+
+    def validate_delete(self):
+        similarities = get_rows(Similarity.objects, self.ids.values(), [])
+        for index, pk in self.ids.items():
+            if pk not in similarities:
+                self.add_error(index, 'id', 'Unknown similarity.')
+
+    def save(self):
+        if self.method == 'POST':
+            similarities = [Similarity(node_one_id=it['node_one'], node_two_id=it['node_two']) for it in self.items]
+            bulk_create_similarities(similarities)
+            ids = {}
+            pairs = [it.pair for it in similarities]
+            for i in range(0, len(pairs), 500):
+                ids.update(Similarity.objects.filter(pair__in=pairs[i:i + 500]).values_list('pair', 'id'))
+            return [{'index': index, 'id': ids[it.pair]} for index, it in enumerate(similarities)]
+
+        if self.method == 'PATCH':
+            previous, similarities = [], []
+            for index, item in enumerate(self.items):
+                similarity = self.similarities[self.ids[index]]
+                previous.append((similarity.node_one_id, similarity.node_two_id))
+                similarity.node_one_id, similarity.node_two_id = item['node_one'], item['node_two']
+                similarities.append(similarity)
+            bulk_update_similarities(similarities, previous)
+        else:
+            bulk_delete_similarities(self.ids.values())
+        return [{'index': index, 'id': pk} for index, pk in self.ids.items()]
@@ -0,0 +1,103 @@
+import json
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from contextlib import contextmanager
+from io import StringIO
+
+import django
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+
+@contextmanager
+def benchmark_database():
+    """
+    Run the benchmark in the test environment against a throwaway test
+    database, never the real one
+    """
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def seed_catalogue(size, density, component_size=50, seed=0, **shape):
+    call_command(
+        'reset_db',
+        categories=size,
+        density=density,
+        component_size=component_size,
+        seed=seed,
+        batch_size=5000,
+        stdout=StringIO(),
+        **shape,
+    )
+
+
+def measure(function, repeat=3):
+    """
+    Return the wall times, the query count and the peak traced memory of
+    calling function - after one warm-up call ( e.g. to fill the caches ),
+    with memory traced in a separate call, so that its overhead does not
+    distort the timings
+    """
+    function()
+
+    times = []
+    for i in range(repeat):
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            function()
+            times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        function()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'time_min': min(times),
+        'time_median': statistics.median(times),
+        'queries': len(context),
+        'peak_memory': peak_memory,
+    }
+
+
+def percentiles(values, points=(50, 95, 99)):
+    values = sorted(values)
+    return {
+        f'p{point}': values[min(len(values) - 1, round(point / 100 * (len(values) - 1)))] if values else None
+        for point in points
+    }
+
+
+def get_metadata():
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        'commit': commit,
+        'date': timezone.now().isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+    }
+
+
+def write_results(path, results):
+    with open(path, 'w') as output:
+        json.dump({'meta': get_metadata(), 'results': results}, output, indent=4)
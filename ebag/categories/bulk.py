@@ -0,0 +1,273 @@
+from categories.images import create_renditions
+from categories.models import Category, Similarity, get_subtree_filter
+from categories.utils import (
+    bump_category_graph_version,
+    defer_category_maintenance,
+    merge_category_islands_many,
+    split_category_island,
+)
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.management.color import no_style
+from django.db import connection
+from django.db.models import Max, Q
+from django.utils import timezone
+
+
+def allocate_category_ids(count):
+    """
+    Reserve ids above the current maximum, so that parents can be linked
+    before the rows are inserted ( bulk_create does not return ids on every
+    database backend )
+
+    Nothing stops a concurrent writer from taking the same ids, so this is
+    only for freshly flushed tables ( reset_db ) - see bulk_insert_categories
+    """
+    start = (Category.objects.aggregate(Max('id'))['id__max'] or 0) + 1
+    return range(start, start + count)
+
+
+def bulk_create_categories(categories, batch_size=1000, progress=None):
+    """
+    Insert new categories with their derived columns in batches
+
+    Every category must have its id set and its parent must either exist
+    already or precede it in the list. Categories without an island start
+    as an island of their own.
+    """
+    parent_ids = {it.parent_id for it in categories} - {it.id for it in categories} - {None}
+    parents = dict(Category.objects.filter(id__in=parent_ids).values_list('id', 'path'))
+
+    paths = {}
+    for category in categories:
+        category.set_name()
+        parent_path = paths.get(category.parent_id) or parents.get(category.parent_id) or '/'
+        category.path = paths[category.id] = f'{parent_path}{category.id}/'
+        category.depth = category.path.count('/') - 2
+        if category.island is None and not category.is_root:
+            category.island = category.id
+
+    for i in range(0, len(categories), batch_size):
+        Category.objects.bulk_create(categories[i:i + batch_size])
+        if progress:
+            progress(min(i + batch_size, len(categories)))
+
+    reset_sequences()
+    bump_category_graph_version()
+
+
+def bulk_insert_categories(categories, parents, batch_size=1000):
+    """
+    Insert new categories with ids assigned by the database, which is safe
+    next to concurrent writers, and set their derived columns
+
+    `parents[i]` is the index of the parent of categories[i] in the list -
+    it must precede it - or None for an existing parent_id. The categories
+    are inserted one tree level at a time and their ids read back by their
+    ( unique ) slugs before the next level is linked to them.
+    """
+    levels, depths = [], {}
+    for index, parent in enumerate(parents):
+        depths[index] = 0 if parent is None else depths[parent] + 1
+        if depths[index] == len(levels):
+            levels.append([])
+        levels[depths[index]].append(index)
+
+    for level in levels:
+        inserted = []
+        for index in level:
+            category = categories[index]
+            category.set_name()
+            if parents[index] is not None:
+                category.parent_id = categories[parents[index]].id
+            inserted.append(category)
+        for i in range(0, len(inserted), batch_size):
+            Category.objects.bulk_create(inserted[i:i + batch_size])
+
+        slugs = [it.slug for it in inserted]
+        ids = {}
+        for i in range(0, len(slugs), 500):
+            ids.update(Category.objects.filter(slug__in=slugs[i:i + 500]).values_list('slug', 'id'))
+        for category in inserted:
+            category.id = ids[category.slug]
+
+    parent_ids = {it.parent_id for it in categories} - {it.id for it in categories} - {None}
+    paths = dict(Category.objects.filter(id__in=parent_ids).values_list('id', 'path'))
+    for level in levels:
+        for index in level:
+            category = categories[index]
+            category.path = paths[category.id] = f'{paths.get(category.parent_id) or "/"}{category.id}/'
+            category.depth = category.path.count('/') - 2
+            if category.island is None and not category.is_root:
+                category.island = category.id
+    Category.objects.bulk_update(categories, ['path', 'depth', 'island'], batch_size=batch_size)
+
+    bump_category_graph_version()
+
+
+def bulk_create_similarities(similarities, batch_size=1000, progress=None, merge_islands=True):
+    """
+    Insert new similarities with ids assigned by the database - safe on
+    request paths ( bulk REST, imports ), as the sequences are left alone
+    """
+    for similarity in similarities:
+        similarity.pair = Similarity.get_pair(similarity.node_one_id, similarity.node_two_id)
+
+    for i in range(0, len(similarities), batch_size):
+        Similarity.objects.bulk_create(similarities[i:i + batch_size])
+        if progress:
+            progress(min(i + batch_size, len(similarities)))
+
+    if merge_islands:
+        merge_category_islands_many([(it.node_one_id, it.node_two_id) for it in similarities])
+    bump_category_graph_version()
+
+
+def bulk_update_categories(categories, fields, moved=(), batch_size=1000):
+    """
+    Update existing categories in batches - `moved` holds the ids of those
+    with a new parent, whose paths ( and subtrees ) are then moved one by
+    one, since every move may depend on another
+    """
+    now = timezone.now()
+    for category in categories:
+        category.set_name()
+        category.updated_at = now
+    fields = [*fields, 'slug', 'updated_at'] if 'name' in fields else [*fields, 'updated_at']
+    Category.objects.bulk_update(categories, fields, batch_size=batch_size)
+
+    for category in categories:
+        if category.id in moved:
+            category.set_path()
+    bump_category_graph_version()
+
+
+def bulk_delete_categories(ids, batch_size=500):
+    """
+    Delete categories at once: their surviving descendants are re-rooted
+    from their paths in one pass and every island they belonged to is split
+    once, instead of once per deleted row and similarity
+    """
+    ids = list(ids)
+    rows = {}
+    for i in range(0, len(ids), batch_size):
+        rows.update(Category.objects.filter(id__in=ids[i:i + batch_size]).values_list('id', 'path'))
+    islands = get_islands(ids)
+
+    with defer_category_maintenance(rebuild=False):
+        for i in range(0, len(ids), batch_size):
+            Category.objects.filter(id__in=ids[i:i + batch_size]).delete()
+
+    root_node = Category.objects.get_root()
+    # a subtree sorts right after its top, so nested deletions are skipped in one pass
+    prefixes = []
+    for path in sorted(rows.values()):
+        if not prefixes or not path.startswith(prefixes[-1]):
+            prefixes.append(path)
+    moved = []
+    for i in range(0, len(prefixes), batch_size):
+        subtrees = Q()
+        for prefix in prefixes[i:i + batch_size]:
+            subtrees |= get_subtree_filter(prefix)
+        for category in Category.objects.filter(subtrees).only('id', 'path', 'depth'):
+            parts = category.path.strip('/').split('/')
+            last = max(index for index, it in enumerate(parts) if int(it) in rows)
+            category.path = root_node.path + ''.join(f'{it}/' for it in parts[last + 1:])
+            category.depth = root_node.depth + len(parts) - last - 1
+            moved.append(category)
+    Category.objects.bulk_update(moved, ['path', 'depth'], batch_size=1000)
+
+    for island in islands:
+        split_category_island(island)
+    bump_category_graph_version()
+
+
+def bulk_update_similarities(similarities, previous, batch_size=1000):
+    """
+    Update existing similarities in batches - `previous` holds the pairs of
+    nodes they had before, whose islands are split once each before the new
+    pairs are merged
+    """
+    now = timezone.now()
+    for similarity in similarities:
+        similarity.pair = Similarity.get_pair(similarity.node_one_id, similarity.node_two_id)
+        similarity.updated_at = now
+    islands = get_islands([pk for pair in previous for pk in pair])
+
+    fields = ['node_one', 'node_two', 'pair', 'updated_at']
+    Similarity.objects.bulk_update(similarities, fields, batch_size=batch_size)
+
+    for island in islands:
+        split_category_island(island)
+    merge_category_islands_many([(it.node_one_id, it.node_two_id) for it in similarities])
+    bump_category_graph_version()
+
+
+def bulk_delete_similarities(ids, batch_size=500):
+    ids = list(ids)
+    nodes = []
+    for i in range(0, len(ids), batch_size):
+        pairs = Similarity.objects.filter(id__in=ids[i:i + batch_size]).values_list('node_one_id', 'node_two_id')
+        nodes.extend(pk for pair in pairs for pk in pair)
+    islands = get_islands(nodes)
+
+    with defer_category_maintenance(rebuild=False):
+        for i in range(0, len(ids), batch_size):
+            Similarity.objects.filter(id__in=ids[i:i + batch_size]).delete()
+
+    for island in islands:
+        split_category_island(island)
+    bump_category_graph_version()
+
+
+def get_islands(nodes, batch_size=500):
+    nodes = list(set(nodes))
+    islands = set()
+    for i in range(0, len(nodes), batch_size):
+        islands.update(Category.objects.filter(id__in=nodes[i:i + batch_size]).values_list('island', flat=True))
+    islands.discard(None)
+    return islands
+
+
+def reset_sequences():
+    """
+    Move the id sequences past rows inserted with explicit ids - only for
+    seeding ( reset_db ), never next to concurrent writers
+    """
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [Category, Similarity]):
+            cursor.execute(sql)
+
+
+def get_missing_images(names):
+    storage = Category._meta.get_field('image').storage
+    missing = set()
+    for name in names:
+        try:
+            if not storage.exists(name):
+                missing.add(name)
+        except SuspiciousFileOperation:
+            missing.add(name)
+    return missing
+
+
+def get_image_renditions(names, batch_size=500):
+    """
+    Check that every referenced image is stored and return the renditions
+    of those already used by a Category
+    """
+    names = sorted(names)
+    missing = get_missing_images(names)
+    if missing:
+        raise ValueError(f'The image "{min(missing)}" is not stored.')
+
+    renditions = {}
+    for i in range(0, len(names), batch_size):
+        rows = Category.objects.filter(image__in=names[i:i + batch_size]).exclude(renditions={})
+        renditions.update(rows.values_list('image', 'renditions'))
+    return renditions
+
+
+def render_images(names):
+    storage = Category._meta.get_field('image').storage
+    for name in names:
+        Category.objects.filter(image=name, renditions={}).update(renditions=create_renditions(storage, name))
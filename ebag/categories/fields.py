@@ -0,0 +1,69 @@
+from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.template.defaultfilters import filesizeformat
+from PIL import Image
+
+
+class CategoryImageField(forms.ImageField):
+    """
+    Validate an uploaded image from its header alone: Pillow's Image.open
+    reads the first chunks for the format and the dimensions and decodes
+    nothing, so oversized images are rejected before they cost any memory
+
+    Spooled uploads are opened from their temporary file, never copied into
+    memory, and the limits come from the CATEGORIES_IMAGE_MAX_* settings
+    """
+    default_error_messages = {
+        **forms.ImageField.default_error_messages,
+        'max_bytes': 'The image file is too large ( %(size)s, the limit is %(limit)s ).',
+        'max_pixels': 'The image is too large ( %(width)s x %(height)s pixels, the limit is %(limit)s pixels ).',
+        'format': 'The image format %(format)s is not supported ( use %(formats)s ).',
+        'decompression_bomb': 'The image is too large to be processed safely.',
+    }
+
+    def to_python(self, data):
+        file = forms.FileField.to_python(self, data)
+        if file is None:
+            return None
+
+        max_bytes = getattr(settings, 'CATEGORIES_IMAGE_MAX_BYTES', None)
+        if max_bytes and file.size > max_bytes:
+            raise self.error('max_bytes', size=filesizeformat(file.size), limit=filesizeformat(max_bytes))
+
+        if hasattr(data, 'temporary_file_path'):
+            source = data.temporary_file_path()
+        else:
+            source = data
+            source.seek(0)
+
+        try:
+            image = Image.open(source)
+        except Image.DecompressionBombError as error:
+            raise self.error('decompression_bomb') from error
+        except Exception as error:
+            raise self.error('invalid_image') from error
+
+        # leaving the block closes only a file opened from the path
+        with image:
+            self.validate_image(image)
+            file.image = image
+            file.content_type = Image.MIME.get(image.format)
+
+        if hasattr(file, 'seek') and callable(file.seek):
+            file.seek(0)
+        return file
+
+    def validate_image(self, image):
+        formats = getattr(settings, 'CATEGORIES_IMAGE_ALLOWED_FORMATS', ['JPEG', 'PNG', 'WEBP', 'GIF'])
+        if image.format not in formats:
+            raise self.error('format', format=image.format, formats=', '.join(formats))
+
+        max_pixels = getattr(settings, 'CATEGORIES_IMAGE_MAX_PIXELS', None)
+        if max_pixels and image.width * image.height > max_pixels:
+            raise self.error('max_pixels', width=image.width, height=image.height, limit=max_pixels)
+
+    def error(self, code, **params):
+        # the REST framework swaps in its own error_messages, without ours
+        message = self.error_messages.get(code, self.default_error_messages[code])
+        return ValidationError(message, code=code, params=params)
@@ -0,0 +1,109 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections
+from PIL import Image, ImageOps, features
+
+logger = logging.getLogger(__name__)
+
+RENDITION_DIRECTORY = 'renditions'
+RENDITION_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'CATEGORIES_IMAGE_WORKERS', 2),
+                thread_name_prefix='categories-images',
+            )
+    return _executor
+
+
+def run_in_background(function, *args):
+    """
+    Run function in the image worker pool, off the request thread - or in
+    place with settings.CATEGORIES_IMAGE_SYNC ( e.g. for tests )
+    """
+    if getattr(settings, 'CATEGORIES_IMAGE_SYNC', False):
+        return function(*args)
+
+    def run():
+        try:
+            function(*args)
+        except Exception:
+            logger.exception('Image task %s failed', function.__name__)
+        finally:
+            close_old_connections()
+
+    return get_executor().submit(run)
+
+
+def get_rendition_widths(width):
+    """
+    The configured widths narrower than the original, or just the original
+    width for small images - never upscale
+    """
+    widths = sorted(it for it in getattr(settings, 'CATEGORIES_IMAGE_WIDTHS', [320, 640, 1280]) if it < width)
+    return widths or [width]
+
+
+def get_rendition_formats():
+    """
+    The configured formats this Pillow build can write ( WebP support is
+    optional in Pillow )
+    """
+    formats = getattr(settings, 'CATEGORIES_IMAGE_FORMATS', ['webp', 'jpeg'])
+    return [it for it in formats if it != 'webp' or features.check('webp')]
+
+
+def create_renditions(storage, name):
+    """
+    Store resized copies of the image at every rendition width in every
+    supported format and return their names as {format: {width: name}}
+    """
+    formats = get_rendition_formats()
+    stem = os.path.splitext(os.path.basename(name))[0]
+    directory = os.path.join(os.path.dirname(name), RENDITION_DIRECTORY)
+
+    with storage.open(name, 'rb') as file:
+        image = ImageOps.exif_transpose(Image.open(file))
+        image = image.convert('RGB')
+
+    renditions = {}
+    for width in get_rendition_widths(image.width):
+        height = max(1, round(image.height * width / image.width))
+        resized = image.resize((width, height), Image.LANCZOS) if width != image.width else image
+        for image_format in formats:
+            pil_format, options = RENDITION_FORMATS[image_format]
+            content = BytesIO()
+            resized.save(content, pil_format, **options)
+            rendition_name = os.path.join(directory, f'{stem}_{width}w.{image_format}')
+            rendition_name = storage.save(rendition_name, ContentFile(content.getvalue()))
+            renditions.setdefault(image_format, {})[str(width)] = rendition_name
+
+    return renditions
+
+
+def get_srcset(storage, renditions, image_format, build_url=None):
+    """
+    Return the `srcset` attribute value ( 'url 320w, url 640w' ) of the
+    renditions in the given format
+    """
+    build_url = build_url or (lambda url: url)
+    widths = renditions.get(image_format, {})
+    return ', '.join(
+        f'{build_url(storage.url(widths[width]))} {width}w' for width in sorted(widths, key=int)
+    )
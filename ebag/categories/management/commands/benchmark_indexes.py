@@ -0,0 +1,78 @@
+from categories.benchmarks import benchmark_database, measure, seed_catalogue, write_results
+from categories.models import Category, Similarity
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+
+class Command(BaseCommand):
+    help = 'Explain and time the hot lookups before and after the index migration ( in a test database ).'
+
+    before_migration = '0003_category_island'
+    after_migration = '0004_similarity_pair_and_indexes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=100000)
+        parser.add_argument('--density', type=float, default=2.0)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('-o', '--output', default='benchmark_indexes.json')
+
+    def handle(self, *args, **kwargs):
+        results = []
+        with benchmark_database():
+            seed_catalogue(kwargs['size'], kwargs['density'], seed=kwargs['seed'])
+            similarity = Similarity.objects.values('node_one_id', 'node_two_id').order_by('id').last()
+
+            call_command('migrate', 'categories', self.before_migration, verbosity=0)
+            results += self.run('before', self.get_before_queries(similarity), kwargs)
+            call_command('migrate', 'categories', self.after_migration, verbosity=0)
+            results += self.run('after', self.get_after_queries(similarity), kwargs)
+
+        write_results(kwargs['output'], results)
+        self.stdout.write(f'Results written to {kwargs["output"]}')
+
+    def run(self, schema, queries, kwargs):
+        results = []
+        for query, queryset in queries:
+            result = measure(lambda: list(queryset.all()), kwargs['repeat'])
+            result.update({
+                'size': kwargs['size'],
+                'density': kwargs['density'],
+                'schema': schema,
+                'query': query,
+                'plan': queryset.explain(),
+            })
+            results.append(result)
+            self.stdout.write(f'{schema:<7} {query:<28} {result["time_median"] * 1000:>10.3f} ms')
+            self.stdout.write(self.style.MIGRATE_LABEL(f'        {result["plan"]}'))
+        return results
+
+    @staticmethod
+    def get_before_queries(similarity):
+        """
+        The lookups as the views and forms made them before the migration -
+        the similarity check being two queries ( similar, then mirror )
+        """
+        node_one, node_two = similarity['node_one_id'], similarity['node_two_id']
+        return [
+            ('root_by_name', Category.objects.filter(name=Category.ROOT_NAME).values('id')),
+            (
+                'similarity_pair',
+                Similarity.objects.filter(
+                    Q(node_one=node_one, node_two=node_two) | Q(node_one=node_two, node_two=node_one)
+                ).values('id'),
+            ),
+            ('category_created_at', Category.objects.order_by('-created_at', '-id').values('id')[:100]),
+            ('similarity_created_at', Similarity.objects.order_by('-created_at', '-id').values('id')[:100]),
+        ]
+
+    @staticmethod
+    def get_after_queries(similarity):
+        pair = Similarity.get_pair(similarity['node_one_id'], similarity['node_two_id'])
+        return [
+            ('root_by_name', Category.objects.filter(name=Category.ROOT_NAME).values('id')),
+            ('similarity_pair', Similarity.objects.filter(pair=pair).values('id')),
+            ('category_created_at', Category.objects.order_by('-created_at', '-id').values('id')[:100]),
+            ('similarity_created_at', Similarity.objects.order_by('-created_at', '-id').values('id')[:100]),
+        ]
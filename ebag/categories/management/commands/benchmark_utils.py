@@ -0,0 +1,62 @@
+from categories.benchmarks import benchmark_database, measure, seed_catalogue, write_results
+from categories.models import Category
+from categories.utils import (
+    get_category_islands,
+    get_category_islands_to_string,
+    get_category_parents,
+    get_category_tree,
+    get_category_tree_nodes,
+    get_category_tree_to_string,
+)
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Time the category tree and island functions on seeded catalogues ( in a test database ).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+        parser.add_argument('--densities', type=float, nargs='+', default=[0.5, 2.0])
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('-o', '--output', default='benchmark_utils.json')
+
+    def handle(self, *args, **kwargs):
+        results = []
+        with benchmark_database():
+            for size in kwargs['sizes']:
+                for density in kwargs['densities']:
+                    seed_catalogue(size, density, seed=kwargs['seed'], skew=0.2)
+                    for function, node, measured in self.get_functions():
+                        result = measure(measured, kwargs['repeat'])
+                        result.update({'size': size, 'density': density, 'function': function, 'node': node})
+                        results.append(result)
+                        self.stdout.write(
+                            f'{size:>8} {density:>5} {function:<40} {node:<6} '
+                            f'{result["time_median"] * 1000:>10.1f} ms {result["queries"]:>6} queries '
+                            f'{result["peak_memory"] / 2 ** 20:>8.1f} MiB'
+                        )
+
+        write_results(kwargs['output'], results)
+        self.stdout.write(f'Results written to {kwargs["output"]}')
+
+    @staticmethod
+    def get_functions():
+        root_node = Category.objects.get_root()
+        deep_node = Category.objects.order_by('-depth', 'id').first()
+        island_node = Category.objects.exclude(is_root=True).order_by('island', 'id').first()
+
+        return [
+            ('get_category_tree', 'root', lambda: get_category_tree(root_node, 'by_link')),
+            ('get_category_tree_nodes', 'root', lambda: get_category_tree_nodes(root_node)),
+            ('get_category_parents', 'deep', lambda: get_category_parents(deep_node)),
+            ('get_category_islands', 'root', lambda: get_category_islands(root_node, 'by_link')),
+            ('get_category_islands', 'island', lambda: get_category_islands(island_node, 'by_link')),
+            ('get_category_tree_to_string', 'root', lambda: get_category_tree_to_string.__wrapped__(root_node)),
+            ('get_category_tree_to_string (cached)', 'root', lambda: get_category_tree_to_string(root_node)),
+            (
+                'get_category_islands_to_string', 'root',
+                lambda: get_category_islands_to_string.__wrapped__(root_node),
+            ),
+            ('get_category_islands_to_string (cached)', 'root', lambda: get_category_islands_to_string(root_node)),
+        ]
@@ -0,0 +1,97 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from categories.benchmarks import benchmark_database, percentiles, seed_catalogue, write_results
+from categories.models import Category, Similarity
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+
+class Command(BaseCommand):
+    help = 'Measure the latency of the HTML and REST views under concurrency ( in a test database ).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+        parser.add_argument('--density', type=float, default=1.0)
+        parser.add_argument('--requests', type=int, default=50, help='The number of requests per view.')
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('-o', '--output', default='benchmark_views.json')
+
+    def handle(self, *args, **kwargs):
+        results = []
+        with benchmark_database():
+            for size in kwargs['sizes']:
+                seed_catalogue(size, kwargs['density'], seed=kwargs['seed'], skew=0.2)
+                for view, links in self.get_links().items():
+                    result = self.load(links, kwargs['requests'], kwargs['concurrency'])
+                    result.update({'size': size, 'view': view, 'concurrency': kwargs['concurrency']})
+                    results.append(result)
+                    self.stdout.write(
+                        f'{size:>8} {view:<20} '
+                        + ' '.join(f'{key} {result[key] * 1000:>9.1f} ms' for key in ('p50', 'p95', 'p99'))
+                        + f' {result["queries"]:>8.1f} queries {result["errors"]:>4} errors'
+                    )
+
+        write_results(kwargs['output'], results)
+        self.stdout.write(f'Results written to {kwargs["output"]}')
+
+    @staticmethod
+    def get_links():
+        root_node = Category.objects.get_root()
+        categories = list(Category.objects.exclude(id=root_node.id).order_by('?').values_list('id', 'slug')[:100])
+        similarities = list(Similarity.objects.order_by('?').values_list('id', flat=True)[:100])
+
+        return {
+            'index': [reverse('categories:index')],
+            'category_display': [
+                reverse('categories:category_display', args=[pk, slug]) for pk, slug in categories
+            ],
+            'category_list': [reverse('categories:category_list')],
+            'similarity_list': [reverse('categories:similarity_list')],
+            'similarity_display': [reverse('categories:similarity_display', args=[pk]) for pk in similarities],
+            'rest_categories': ['/rest/categories/'],
+            'rest_similarities': ['/rest/similarities/'],
+        }
+
+    @staticmethod
+    def load(links, requests, concurrency):
+        """
+        Send the requests from concurrency threads ( each with its own client
+        and database connection ) and collect latencies and query counts
+        """
+        local = threading.local()
+        lock = threading.Lock()
+        latencies = []
+        queries = []
+        errors = []
+
+        def send(index):
+            if not hasattr(local, 'client'):
+                local.client = Client()
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                response = local.client.get(links[index % len(links)])
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                latency = time.perf_counter() - start
+            with lock:
+                latencies.append(latency)
+                queries.append(len(context))
+                if response.status_code != 200:
+                    errors.append(response.status_code)
+
+        with ThreadPoolExecutor(concurrency) as executor:
+            list(executor.map(send, range(requests)))
+
+        result = percentiles(latencies)
+        result.update({
+            'requests': requests,
+            'queries': sum(queries) / len(queries),
+            'errors': len(errors),
+        })
+        return result
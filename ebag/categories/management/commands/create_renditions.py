@@ -0,0 +1,23 @@
+from categories.images import create_renditions
+from categories.models import Category
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Generate the image renditions of the Categories without them ( or of all with --all ).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Regenerate the renditions of every Category.')
+
+    def handle(self, *args, **kwargs):
+        storage = Category._meta.get_field('image').storage
+        categories = Category.objects.exclude(image='')
+        if not kwargs['all']:
+            categories = categories.filter(renditions={})
+
+        # categories sharing a stored image share its renditions
+        names = categories.order_by('image').values_list('image', flat=True).distinct()
+        for count, name in enumerate(names.iterator(), 1):
+            renditions = create_renditions(storage, name)
+            updated = categories.filter(image=name).update(renditions=renditions)
+            self.stdout.write(f'Rendered {str(count).rjust(8)} {name} ( {updated} categories )')
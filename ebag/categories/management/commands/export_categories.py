@@ -0,0 +1,28 @@
+from categories.transfer import TRANSFER_FORMATS, export_records, get_transfer_format, write_records
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Stream the Categories and Similarities as newline-delimited JSON or CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-o', '--output', help='The output file ( the standard output by default ).')
+        parser.add_argument('--format', choices=TRANSFER_FORMATS, help='Implied by the output extension by default.')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **kwargs):
+        try:
+            file_format = get_transfer_format(kwargs.get('format'), kwargs.get('output'))
+        except ValueError as error:
+            raise CommandError(error)
+
+        lines = write_records(export_records(kwargs['chunk_size']), file_format)
+        if not kwargs.get('output'):
+            self.stdout.ending = ''
+            for line in lines:
+                self.stdout.write(line)
+            return
+
+        with open(kwargs['output'], 'w', newline='', encoding='utf-8') as output:
+            output.writelines(lines)
+        self.stdout.write(f'Exported to {kwargs["output"]}')
@@ -0,0 +1,22 @@
+from categories.transfer import TRANSFER_FORMATS, get_transfer_format, import_records, read_records
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Import Categories and Similarities from newline-delimited JSON or CSV ( see export_categories ).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='The file to import.')
+        parser.add_argument('--format', choices=TRANSFER_FORMATS, help='Implied by the input extension by default.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **kwargs):
+        try:
+            file_format = get_transfer_format(kwargs.get('format'), kwargs['input'])
+            with open(kwargs['input'], newline='', encoding='utf-8') as lines:
+                categories, similarities = import_records(read_records(lines, file_format), kwargs['batch_size'])
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+
+        self.stdout.write(f'Imported {"Category".rjust(16)} {str(categories).rjust(8)}')
+        self.stdout.write(f'Imported {"Similarity".rjust(16)} {str(similarities).rjust(8)}')
@@ -1,8 +1,24 @@
+import os
 import random
 
+from categories.bulk import allocate_category_ids, bulk_create_categories, bulk_create_similarities
+from categories.images import create_renditions
 from categories.models import Category, Similarity
+from categories.seeding import (
+    COMPONENT_DISTRIBUTIONS,
+    generate_category_parents,
+    generate_component_pairs,
+    generate_random_pairs,
+)
 from categories.tests.utils import create_category, create_similarity
-from django.core.management.base import BaseCommand
+from categories.utils import DisjointSet, defer_category_maintenance
+from django.conf import settings
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+SHAPE_OPTIONS = ['depth', 'branching', 'skew', 'density', 'component_size']
 
 
 class Command(BaseCommand):
@@ -11,16 +27,44 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument('-c', '--categories', type=int)
         parser.add_argument('-s', '--similarities', type=int)
+        parser.add_argument(
+            '-b', '--bulk', action='store_true',
+            help='Insert in batches within one transaction, sharing one stored image.',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--seed', type=int, help='Seed the random generator for repeatable runs.')
+
+        shape = parser.add_argument_group('tree shape', 'Generate a shaped catalogue ( implies --bulk ).')
+        shape.add_argument('--depth', type=int, help='The maximum depth of the tree.')
+        shape.add_argument('--branching', type=int, help='The maximum number of sub categories per node.')
+        shape.add_argument(
+            '--skew', type=float,
+            help='From 0 ( uniform parents, wide fan-out ) to 1 ( deep chains ).',
+        )
+        shape.add_argument(
+            '--density', type=float,
+            help='Similarities per category, generated within islands instead of [s] random attempts.',
+        )
+        shape.add_argument('--component-size', type=int, default=None, help='The maximum size of an island.')
+        shape.add_argument('--component-distribution', choices=COMPONENT_DISTRIBUTIONS, default='uniform')
 
     def handle(self, *args, **kwargs):
         count_categories = kwargs.get('categories')
         count_similarities = kwargs.get('similarities')
 
-        Category.objects.all().delete()
+        if kwargs.get('batch_size') is not None and kwargs['batch_size'] < 1:
+            raise CommandError('Batch size must be at least 1.')
 
-        root_node = create_category(Category.ROOT_NAME)
+        rng = random.Random(kwargs.get('seed'))
 
-        self.stdout.write(f'Added {"Root".rjust(16)} {str(1).rjust(8)}')
+        if kwargs.get('bulk') or any(kwargs.get(it) is not None for it in SHAPE_OPTIONS):
+            if kwargs.get('skew') is not None and not 0 <= kwargs['skew'] <= 1:
+                raise CommandError('Skew must be between 0 and 1.')
+            with transaction.atomic():
+                self.handle_bulk(count_categories or 0, count_similarities or 0, rng, **kwargs)
+            return
+
+        root_node = self.reset()
 
         categories = []
         similarities = 0
@@ -29,7 +73,7 @@ class Command(BaseCommand):
             return
 
         for i in range(1, count_categories + 1):
-            parent = random.choice(categories + [root_node])
+            parent = rng.choice(categories + [root_node])
             categories.append(create_category(f'Category {i}', parent))
             self.stdout.write(f'Added {"Category".rjust(16)} {str(i).rjust(8)}')
 
@@ -37,11 +81,92 @@ class Command(BaseCommand):
             return
 
         for i in range(1, count_similarities + 1):
-            node_one = random.choice(categories)
-            node_two = random.choice(categories)
+            node_one = rng.choice(categories)
+            node_two = rng.choice(categories)
             if node_one != node_two:
                 if not Similarity.objects.filter(node_one=node_one, node_two=node_two).exists():
                     if not Similarity.objects.filter(node_one=node_two, node_two=node_one).exists():
                         similarities += 1
                         create_similarity(node_one, node_two)
                         self.stdout.write(f'Added {"Similarity".rjust(16)} {str(similarities).rjust(8)}')
+
+    def handle_bulk(self, count_categories, count_similarities, rng, **kwargs):
+        root_node = self.reset(flush=True)
+
+        if count_categories < 1:
+            return
+
+        try:
+            parents = generate_category_parents(
+                count_categories,
+                max_depth=kwargs.get('depth'),
+                branching=kwargs.get('branching'),
+                skew=kwargs.get('skew') or 0.0,
+                rng=rng,
+            )
+        except ValueError as error:
+            raise CommandError(error)
+
+        ids = allocate_category_ids(count_categories)
+
+        if kwargs.get('density') is not None:
+            component_size = kwargs.get('component_size') or count_categories
+            pairs = generate_component_pairs(
+                ids, kwargs['density'], component_size, kwargs.get('component_distribution'), rng,
+            )
+        elif count_similarities > 0 and count_categories > 1:
+            pairs = generate_random_pairs(ids, count_similarities, rng)
+        else:
+            pairs = set()
+
+        islands = DisjointSet(ids)
+        for node_one, node_two in pairs:
+            islands.union(node_one, node_two)
+        islands = {pk: min(group) for group in islands.groups() for pk in group}
+
+        image = self.store_image('cat01.jpg')
+        renditions = create_renditions(Category._meta.get_field('image').storage, image)
+        categories = []
+        for i, (pk, parent) in enumerate(zip(ids, parents)):
+            categories.append(Category(
+                id=pk,
+                name=f'Category {i + 1}',
+                description=root_node.description,
+                image=image,
+                renditions=renditions,
+                parent_id=ids[parent - 1] if parent else root_node.id,
+                island=islands[pk],
+            ))
+
+        bulk_create_categories(categories, kwargs.get('batch_size'), self.progress('Category'))
+
+        similarities = [Similarity(node_one_id=node_one, node_two_id=node_two) for node_one, node_two in pairs]
+        bulk_create_similarities(
+            similarities, kwargs.get('batch_size'), self.progress('Similarity'), merge_islands=False,
+        )
+
+    def reset(self, flush=False):
+        if flush:
+            tables = [Similarity._meta.db_table, Category._meta.db_table]
+            connection.ops.execute_sql_flush(connection.ops.sql_flush(no_style(), tables))
+        else:
+            with defer_category_maintenance():
+                Category.objects.all().delete()
+
+        root_node = create_category(Category.ROOT_NAME)
+
+        self.stdout.write(f'Added {"Root".rjust(16)} {str(1).rjust(8)}')
+
+        return root_node
+
+    def progress(self, label):
+        def write(count):
+            self.stdout.write(f'Added {label.rjust(16)} {str(count).rjust(8)}')
+        return write
+
+    @staticmethod
+    def store_image(file_name):
+        file_path = os.path.join(settings.BASE_DIR, 'categories', 'tests', 'files', file_name)
+        storage = Category._meta.get_field('image').storage
+        with open(file_path, 'rb') as file_upload:
+            return storage.save(f'categories/{file_name}', File(file_upload))
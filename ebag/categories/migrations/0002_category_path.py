@@ -0,0 +1,46 @@
+# Generated by Django 3.2.7 on 2026-10-18 16:00
+
+from collections import defaultdict, deque
+
+from django.db import migrations, models
+
+
+def backfill_category_path(apps, schema_editor):
+    Category = apps.get_model('categories', 'Category')
+
+    children = defaultdict(list)
+    categories = {}
+    for category in Category.objects.only('id', 'parent_id'):
+        children[category.parent_id].append(category.id)
+        categories[category.id] = category
+
+    queue = deque((pk, '/', 0) for pk in children[None])
+    while queue:
+        pk, parent_path, depth = queue.popleft()
+        category = categories[pk]
+        category.path = f'{parent_path}{pk}/'
+        category.depth = depth
+        queue.extend((child, category.path, depth + 1) for child in children[pk])
+
+    Category.objects.bulk_update(categories.values(), ['path', 'depth'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('categories', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=1000),
+        ),
+        migrations.RunPython(backfill_category_path, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 3.2.7 on 2026-10-18 16:02
+
+from django.db import migrations, models
+
+
+def backfill_category_island(apps, schema_editor):
+    Category = apps.get_model('categories', 'Category')
+    Similarity = apps.get_model('categories', 'Similarity')
+
+    categories = {it.id: it for it in Category.objects.exclude(name='root').only('id')}
+    parent = {pk: pk for pk in categories}
+
+    def find(item):
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+
+    for node_one, node_two in Similarity.objects.values_list('node_one_id', 'node_two_id'):
+        if node_one in parent and node_two in parent:
+            one, two = find(node_one), find(node_two)
+            parent[max(one, two)] = min(one, two)
+
+    for pk, category in categories.items():
+        category.island = find(pk)
+
+    Category.objects.bulk_update(categories.values(), ['island'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('categories', '0002_category_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='island',
+            field=models.PositiveBigIntegerField(db_index=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_category_island, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 3.2.7 on 2026-10-18 16:20
+
+import logging
+
+from django.db import migrations, models
+import django.db.models.expressions
+
+logger = logging.getLogger(__name__)
+
+
+def backfill_similarity_pair(apps, schema_editor):
+    """
+    Drop self Similarities and the later copies of similar or mirror ones,
+    which the forms never allowed, before the pair becomes unique - every
+    dropped row is logged
+    """
+    Similarity = apps.get_model('categories', 'Similarity')
+
+    seen = set()
+    duplicates = []
+    similarities = []
+    for similarity in Similarity.objects.order_by('created_at', 'id').only('id', 'node_one_id', 'node_two_id'):
+        node_one, node_two = similarity.node_one_id, similarity.node_two_id
+        pair = f'{min(node_one, node_two)}-{max(node_one, node_two)}'
+        if node_one == node_two or pair in seen:
+            duplicates.append((similarity.id, node_one, node_two))
+            continue
+        seen.add(pair)
+        similarity.pair = pair
+        similarities.append(similarity)
+
+    if duplicates:
+        message = f'Dropping {len(duplicates)} self or duplicate Similarities ( id: node_one - node_two ): '
+        message += ', '.join(f'{pk}: {node_one} - {node_two}' for pk, node_one, node_two in duplicates)
+        logger.warning(message)
+
+    ids = [pk for pk, node_one, node_two in duplicates]
+    for i in range(0, len(ids), 500):
+        Similarity.objects.filter(id__in=ids[i:i + 500]).delete()
+    Similarity.objects.bulk_update(similarities, ['pair'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('categories', '0003_category_island'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='similarity',
+            name='pair',
+            field=models.CharField(editable=False, max_length=41, null=True),
+        ),
+        migrations.RunPython(backfill_similarity_pair, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='similarity',
+            name='pair',
+            field=models.CharField(editable=False, max_length=41, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='category',
+            name='name',
+            field=models.CharField(db_index=True, help_text='Enter a unique name.', max_length=200),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['-created_at', '-id'], name='category_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='similarity',
+            index=models.Index(fields=['-created_at', '-id'], name='similarity_created_at_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='similarity',
+            constraint=models.CheckConstraint(check=models.Q(('node_one', django.db.models.expressions.F('node_two')), _negated=True), name='similarity_distinct_nodes'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.7 on 2026-10-18 16:23
+
+from django.db import migrations, models
+
+
+def backfill_category_is_root(apps, schema_editor):
+    Category = apps.get_model('categories', 'Category')
+    Category.objects.filter(name='root').update(is_root=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('categories', '0004_similarity_pair_and_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='is_root',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(backfill_category_is_root, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='category',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_root', True)), fields=('is_root',), name='category_single_root'),
+        ),
+    ]
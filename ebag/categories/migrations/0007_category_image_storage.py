@@ -0,0 +1,19 @@
+# Generated by Django 3.2.7 on 2026-10-18 16:29
+
+import categories.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('categories', '0006_category_renditions'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='category',
+            name='image',
+            field=models.ImageField(storage=categories.storage.ContentAddressedStorage(), upload_to='categories/'),
+        ),
+    ]
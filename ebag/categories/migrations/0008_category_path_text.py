@@ -0,0 +1,18 @@
+# Generated by Django 3.2.7 on 2026-10-18 16:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('categories', '0007_category_image_storage'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='category',
+            name='path',
+            field=models.TextField(db_index=True, default='', editable=False),
+        ),
+    ]
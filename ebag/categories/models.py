@@ -1,15 +1,40 @@
 import re
+import threading
 
-from django.db import models
+from categories.images import create_renditions, get_srcset, run_in_background
+from categories.storage import category_image_storage
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Concat, Substr
 from django.urls import reverse
 from django.utils.text import slugify
 
 
+def get_subtree_filter(path):
+    """
+    Match the node at `path` and all its descendants as a range seek on
+    the path index - '0' sorts right after '/', while `path__startswith`
+    is a LIKE that SQLite runs as a full scan
+    """
+    return Q(path__gte=path, path__lt=path[:-1] + '0')
+
+
 def set_parent():
-    try:
-        return Category.objects.get(name=Category.ROOT_NAME)
-    except Category.DoesNotExist:
-        return None
+    return Category.objects.get_root()
+
+
+class CategoryManager(models.Manager):
+
+    def get_root(self):
+        """
+        Return the Root node or None - a lookup on the partial unique index
+        of the `is_root` flag
+        """
+        return self.filter(is_root=True).order_by('id').first()
+
+    def get_root_id(self):
+        return self.filter(is_root=True).order_by('id').values_list('id', flat=True).first()
 
 
 class Category(models.Model):
@@ -17,25 +42,40 @@ class Category(models.Model):
     Define (Sub)Categories
     """
     ROOT_NAME = 'root'
+    MOVE_ERROR = 'A category cannot be moved under itself or its sub categories.'
 
     name = models.CharField(
         max_length=200,
         help_text='Enter a unique name.',
+        db_index=True,
     )
     slug = models.SlugField(max_length=200, unique=True)
     description = models.TextField(max_length=1000)
-    image = models.ImageField(upload_to='categories/')
+    image = models.ImageField(upload_to='categories/', storage=category_image_storage)
+    renditions = models.JSONField(editable=False, default=dict)
     parent = models.ForeignKey(
         'self',
         on_delete=models.SET(set_parent),
         related_name='sub_categories',
         null=True,
     )
+    is_root = models.BooleanField(editable=False, default=False)
+    path = models.TextField(db_index=True, editable=False, default='')
+    depth = models.PositiveIntegerField(editable=False, default=0)
+    island = models.PositiveBigIntegerField(editable=False, null=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CategoryManager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='category_created_at_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['is_root'], condition=models.Q(is_root=True), name='category_single_root'),
+        ]
 
     def __str__(self):
         return self.name
@@ -44,9 +84,130 @@ class Category(models.Model):
         return reverse('categories:category_display', args=[self.id, self.slug])
 
     def save(self, *args, **kwargs):
+        self.set_name()
+        image_changed = bool(self.image) and not self.image._committed
+        previous = None
+        if image_changed:
+            self.renditions = {}
+            if self.pk is not None:
+                previous = Category.objects.filter(id=self.pk).values_list('image', 'renditions').first()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self.set_path()
+            if image_changed:
+                pk, name = self.id, self.image.name
+                transaction.on_commit(lambda: run_in_background(Category.update_renditions, pk, name))
+                if previous and previous[0] != name:
+                    release_category_image(*previous)
+
+    @staticmethod
+    def update_renditions(pk, name):
+        """
+        Store the renditions of the image - copied from another Category
+        with the same ( content addressed ) image when there is one - unless
+        the image was replaced in the meantime
+        """
+        shared = Category.objects.filter(image=name).exclude(renditions={}).values_list('renditions', flat=True)
+        renditions = shared.first() or create_renditions(Category._meta.get_field('image').storage, name)
+        Category.objects.filter(id=pk, image=name).update(renditions=renditions)
+
+    @property
+    def image_srcset(self):
+        """
+        The `srcset` values of the image renditions by format ( empty until
+        they are generated )
+        """
+        return {
+            image_format: get_srcset(self.image.storage, self.renditions, image_format)
+            for image_format in self.renditions
+        }
+
+    def set_name(self):
         self.name = re.sub(r'\s+', ' ', self.name).strip()
         self.slug = slugify(self.name)
-        super().save(*args, **kwargs)
+        self.is_root = self.name == self.ROOT_NAME
+
+    def set_path(self):
+        """
+        Maintain the materialized path ( '/root_id/.../own_id/' ) and depth
+        of the node and move the paths of all its descendants along with it
+
+        A move under the node itself or one of its descendants would turn
+        the subtree into a cycle, so it raises ValueError instead
+        """
+        rows = Category.objects.filter(id__in=[self.id, self.parent_id]).values_list('id', 'path', 'depth')
+        rows = {pk: (path, depth) for pk, path, depth in rows}
+
+        old_path, old_depth = rows[self.id]
+        if self.parent_id in rows:
+            parent_path, parent_depth = rows[self.parent_id]
+            if old_path and parent_path.startswith(old_path):
+                raise ValueError(self.MOVE_ERROR)
+            path, depth = f'{parent_path or "/"}{self.id}/', parent_depth + 1
+        else:
+            path, depth = f'/{self.id}/', 0
+
+        self.path, self.depth = path, depth
+        if path == old_path and depth == old_depth:
+            return
+
+        if not old_path:
+            Category.objects.filter(id=self.id).update(path=path, depth=depth)
+            return
+
+        Category.objects.filter(get_subtree_filter(old_path)).update(
+            path=Concat(Value(path), Substr('path', len(old_path) + 1), output_field=models.TextField()),
+            depth=F('depth') + (depth - old_depth),
+        )
+
+
+_released_images = threading.local()
+
+
+def release_category_image(name, renditions):
+    """
+    Delete a stored image and its renditions once the transaction commits,
+    if no Category refers to it any more - the images released by one
+    thread are checked together, so that a bulk deletion costs one query
+    """
+    if not name:
+        return
+    if not hasattr(_released_images, 'pending'):
+        _released_images.pending = {}
+    _released_images.pending[name] = renditions
+    transaction.on_commit(delete_released_images)
+
+
+def delete_released_images(batch_size=500):
+    """
+    Delete the released images no Category uses - checked again right
+    before deleting, under the lock the storage moves files with, and never
+    for a file saved within the last CATEGORIES_IMAGE_RELEASE_GRACE seconds:
+    a concurrent upload of the same content may be about to refer to it
+    """
+    pending, _released_images.pending = getattr(_released_images, 'pending', {}), {}
+    unused = set(pending) - get_used_images(pending, batch_size)
+    if not unused:
+        return
+
+    storage = Category._meta.get_field('image').storage
+    grace = getattr(settings, 'CATEGORIES_IMAGE_RELEASE_GRACE', 600)
+    with storage.lock:
+        for name in unused - get_used_images(unused, batch_size):
+            if storage.is_recent(name, grace):
+                continue
+            storage.delete(name)
+            for widths in pending[name].values():
+                for rendition in widths.values():
+                    storage.delete(rendition)
+
+
+def get_used_images(names, batch_size=500):
+    names = list(names)
+    used = set()
+    for i in range(0, len(names), batch_size):
+        used.update(Category.objects.filter(image__in=names[i:i + batch_size]).values_list('image', flat=True))
+    return used
 
 
 class Similarity(models.Model):
@@ -63,14 +224,34 @@ class Similarity(models.Model):
         on_delete=models.CASCADE,
         related_name='related_node_two',
     )
+    pair = models.CharField(max_length=41, unique=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='similarity_created_at_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(check=~models.Q(node_one=F('node_two')), name='similarity_distinct_nodes'),
+        ]
 
     def __str__(self):
         return f'{self.node_one.name} - {self.node_two.name}'
 
     def get_absolute_url(self):
         return reverse('categories:similarity_display', args=[self.id])
+
+    def save(self, *args, **kwargs):
+        self.pair = self.get_pair(self.node_one_id, self.node_two_id)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    @staticmethod
+    def get_pair(node_one_id, node_two_id):
+        """
+        The same key for both orientations of a pair, so that similar and
+        mirror Similarities share one unique index entry
+        """
+        return f'{min(node_one_id, node_two_id)}-{max(node_one_id, node_two_id)}'
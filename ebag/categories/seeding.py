@@ -0,0 +1,103 @@
+import random
+from itertools import accumulate
+
+COMPONENT_DISTRIBUTIONS = ['fixed', 'uniform', 'power']
+
+
+def generate_category_parents(count, max_depth=None, branching=None, skew=0.0, rng=random):
+    """
+    Return the parent index of every new category - index 0 is the Root
+    node and the new categories are numbered from 1 to count
+
+    Skew 0 picks parents uniformly ( shallow, bushy trees ) and skew 1 keeps
+    extending the newest category ( deep chains ). Max depth and branching
+    remove the categories that are full from the candidate parents.
+    """
+    parents = [None]
+    depths = [0]
+    children = [0]
+    candidates = [0]
+    positions = {0: 0}
+
+    def close(node):
+        position = positions.pop(node)
+        last = candidates.pop()
+        if last != node:
+            candidates[position] = last
+            positions[last] = position
+
+    for node in range(1, count + 1):
+        if not candidates:
+            raise ValueError(f'Depth and branching leave no room for more than {node - 1} categories.')
+
+        if skew and node - 1 in positions and rng.random() < skew:
+            parent = node - 1
+        else:
+            parent = candidates[rng.randrange(len(candidates))]
+
+        parents.append(parent)
+        depths.append(depths[parent] + 1)
+        children.append(0)
+
+        children[parent] += 1
+        if branching and children[parent] >= branching:
+            close(parent)
+        if not max_depth or depths[node] < max_depth:
+            positions[node] = len(candidates)
+            candidates.append(node)
+
+    return parents[1:]
+
+
+def generate_random_pairs(nodes, attempts, rng=random):
+    """
+    Return the unique normalised pairs out of attempts random picks
+    """
+    pairs = set()
+    for i in range(attempts):
+        node_one, node_two = rng.choice(nodes), rng.choice(nodes)
+        if node_one != node_two:
+            pairs.add((min(node_one, node_two), max(node_one, node_two)))
+    return pairs
+
+
+def generate_component_pairs(nodes, density, component_size, distribution='uniform', rng=random):
+    """
+    Split the nodes into islands with sizes drawn from the distribution
+    ( capped at component_size ), join each island by a random spanning tree
+    and add random in-island pairs up to density pairs per node
+    """
+    nodes = list(nodes)
+    rng.shuffle(nodes)
+
+    components = []
+    start = 0
+    while start < len(nodes):
+        if distribution == 'fixed':
+            size = component_size
+        elif distribution == 'uniform':
+            size = rng.randint(1, component_size)
+        elif distribution == 'power':
+            size = min(component_size, int(rng.paretovariate(1.5)))
+        else:
+            raise ValueError(f'Unknown component distribution: {distribution}')
+        components.append(nodes[start:start + size])
+        start += size
+
+    pairs = set()
+    for component in components:
+        for i in range(1, len(component)):
+            node_one, node_two = component[i], component[rng.randrange(i)]
+            pairs.add((min(node_one, node_two), max(node_one, node_two)))
+
+    target = int(density * len(nodes))
+    joinable = [it for it in components if len(it) > 2]
+    weights = list(accumulate(len(it) for it in joinable))
+    attempts = 0
+    while joinable and len(pairs) < target and attempts < 2 * target:
+        attempts += 1
+        component = rng.choices(joinable, cum_weights=weights)[0]
+        node_one, node_two = rng.sample(component, 2)
+        pairs.add((min(node_one, node_two), max(node_one, node_two)))
+
+    return pairs
@@ -1,14 +1,104 @@
+from categories.fields import CategoryImageField
+from categories.images import get_srcset
 from categories.models import Category, Similarity
+from categories.validators import check_category_parent, clean_category_name, get_name_errors, get_pair_errors
 from rest_framework import serializers
 
 
-class CategorySerializer(serializers.HyperlinkedModelSerializer):
+class SparseFieldsMixin:
+    """
+    Keep only the fields listed in the `fields` query parameter on reads
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method != 'GET':
+            return
+        fields = request.query_params.get('fields')
+        if fields:
+            for name in set(self.fields) - set(fields.split(',')):
+                self.fields.pop(name)
+
+
+class ImageSrcsetMixin(serializers.Serializer):
+    """
+    Expose the image renditions as absolute `srcset` values by format
+    """
+    image_srcset = serializers.SerializerMethodField()
+
+    def get_image_srcset(self, category):
+        request = self.context.get('request')
+        build_url = request.build_absolute_uri if request else None
+        return {
+            image_format: get_srcset(category.image.storage, category.renditions, image_format, build_url)
+            for image_format in category.renditions
+        }
+
+
+class CategoryRulesMixin(serializers.Serializer):
+    """
+    Check the name and the parent by the rules CategoryManage applies,
+    instead of failing on the `slug` constraint or cutting a subtree off
+    """
+
+    def validate_name(self, name):
+        name = clean_category_name(name)
+        errors = get_name_errors({0: name}, {0: getattr(self.instance, 'id', None)})
+        if errors:
+            raise serializers.ValidationError(errors[0])
+        return name
+
+    def validate_parent(self, parent):
+        if parent is not None:
+            check_category_parent(self.instance, parent)
+        return parent
+
+
+class CategorySerializer(
+    SparseFieldsMixin, ImageSrcsetMixin, CategoryRulesMixin, serializers.HyperlinkedModelSerializer,
+):
+    image = serializers.ImageField(_DjangoImageField=CategoryImageField)
+
     class Meta:
         model = Category
-        fields = ['name', 'description', 'image', 'parent', 'created_at', 'updated_at']
+        fields = ['name', 'description', 'image', 'image_srcset', 'parent', 'created_at', 'updated_at']
+
 
+class CategoryPrimaryKeySerializer(
+    SparseFieldsMixin, ImageSrcsetMixin, CategoryRulesMixin, serializers.ModelSerializer,
+):
+    image = serializers.ImageField(_DjangoImageField=CategoryImageField)
 
-class SimilaritySerializer(serializers.HyperlinkedModelSerializer):
+    class Meta:
+        model = Category
+        fields = ['id', 'name', 'description', 'image', 'image_srcset', 'parent', 'created_at', 'updated_at']
+
+
+class SimilarityPairMixin(serializers.Serializer):
+    """
+    Reject self Similarities and similar or mirror duplicates, as
+    SimilarityManage does, instead of failing on the `pair` constraints
+    """
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        node_one = attrs.get('node_one') or getattr(self.instance, 'node_one', None)
+        node_two = attrs.get('node_two') or getattr(self.instance, 'node_two', None)
+        if node_one and node_two:
+            errors = get_pair_errors({0: (node_one.id, node_two.id)}, {0: getattr(self.instance, 'id', None)})
+            if errors:
+                raise serializers.ValidationError(errors[0])
+        return attrs
+
+
+class SimilaritySerializer(SparseFieldsMixin, SimilarityPairMixin, serializers.HyperlinkedModelSerializer):
     class Meta:
         model = Similarity
         fields = ['node_one', 'node_two', 'created_at', 'updated_at']
+
+
+class SimilarityPrimaryKeySerializer(SparseFieldsMixin, SimilarityPairMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Similarity
+        fields = ['id', 'node_one', 'node_two', 'created_at', 'updated_at']
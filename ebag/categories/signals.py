@@ -0,0 +1,108 @@
+from categories.models import Category, Similarity, get_subtree_filter, release_category_image, set_parent
+from categories.utils import (
+    bump_category_graph_version,
+    is_category_maintenance_deferred,
+    merge_category_islands,
+    split_category_island,
+)
+from django.db import models
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+
+@receiver(post_save, sender=Category)
+def category_post_save(sender, instance, created, **kwargs):
+    """
+    Every new (non-root) category starts as an island of its own
+    """
+    if is_category_maintenance_deferred():
+        return
+
+    if created and not instance.is_root:
+        instance.island = instance.id
+        Category.objects.filter(id=instance.id).update(island=instance.island)
+
+
+@receiver(pre_delete, sender=Category)
+def category_pre_delete(sender, instance, **kwargs):
+    """
+    The sub categories of a deleted node are moved under the Root node, so
+    cut the node's path prefix off all of its descendants ( a range on the
+    path index )
+
+    The path is read back first: a node deleted along with this one may
+    have moved it already
+    """
+    if is_category_maintenance_deferred() or instance.is_root:
+        return
+
+    root_node = set_parent()
+    current = Category.objects.filter(id=instance.id).values_list('path', 'depth').first()
+    if root_node is None or current is None:
+        return
+
+    path, depth = current
+    Category.objects.filter(get_subtree_filter(path)).exclude(id=instance.id).update(
+        path=Concat(Value(root_node.path), Substr('path', len(path) + 1), output_field=models.TextField()),
+        depth=F('depth') - depth + root_node.depth,
+    )
+
+
+@receiver(post_delete, sender=Category)
+def category_post_delete(sender, instance, **kwargs):
+    """
+    The island of a deleted node is already split by the cascade deletion
+    of its similarities and its image is deleted with the transaction
+    unless it is shared
+    """
+    release_category_image(instance.image.name, instance.renditions)
+
+
+@receiver(pre_save, sender=Similarity)
+def similarity_pre_save(sender, instance, **kwargs):
+    instance._previous_nodes = None
+    if instance.pk and not is_category_maintenance_deferred():
+        previous = Similarity.objects.filter(pk=instance.pk).values_list('node_one_id', 'node_two_id').first()
+        instance._previous_nodes = previous
+
+
+@receiver(post_save, sender=Similarity)
+def similarity_post_save(sender, instance, **kwargs):
+    if is_category_maintenance_deferred():
+        return
+
+    previous = instance._previous_nodes
+    if previous == (instance.node_one_id, instance.node_two_id):
+        return
+
+    if previous:
+        for island in get_islands(*previous):
+            split_category_island(island)
+    merge_category_islands(instance.node_one_id, instance.node_two_id)
+
+
+@receiver(post_delete, sender=Similarity)
+def similarity_post_delete(sender, instance, **kwargs):
+    if is_category_maintenance_deferred():
+        return
+
+    for island in get_islands(instance.node_one_id, instance.node_two_id):
+        split_category_island(island)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Similarity)
+@receiver(post_delete, sender=Similarity)
+def category_graph_changed(sender, **kwargs):
+    # deferred maintenance bumps the version once, when it is done
+    if not is_category_maintenance_deferred():
+        bump_category_graph_version()
+
+
+def get_islands(*nodes):
+    islands = set(Category.objects.filter(id__in=nodes).values_list('island', flat=True))
+    islands.discard(None)
+    return islands
@@ -0,0 +1,57 @@
+/* Autocomplete for the selects rendered by categories.widgets.AutocompleteSelect */
+document.querySelectorAll('select[data-autocomplete-url]').forEach(function (select) {
+    const search = document.createElement('input');
+    const more = document.createElement('button');
+    let timer = null;
+    let next = null;
+
+    search.type = 'search';
+    search.placeholder = 'Search...';
+    more.type = 'button';
+    more.textContent = 'More';
+    more.hidden = true;
+    select.before(search);
+    select.after(more);
+
+    function load(after) {
+        const url = new URL(select.dataset.autocompleteUrl, window.location.origin);
+        url.searchParams.set('q', search.value);
+        if (after) {
+            url.searchParams.set('after', after);
+        }
+
+        fetch(url).then(function (response) {
+            return response.json();
+        }).then(function (data) {
+            if (!after) {
+                Array.from(select.options).forEach(function (option) {
+                    if (option.value && !option.selected) {
+                        option.remove();
+                    }
+                });
+            }
+            data.results.forEach(function (result) {
+                if (!select.querySelector('option[value="' + result.id + '"]')) {
+                    select.add(new Option(result.text, result.id));
+                }
+            });
+            next = data.next;
+            more.hidden = !next;
+        });
+    }
+
+    search.addEventListener('input', function () {
+        clearTimeout(timer);
+        timer = setTimeout(function () {
+            load(null);
+        }, 250);
+    });
+    more.addEventListener('click', function () {
+        load(next);
+    });
+    select.addEventListener('focus', function () {
+        if (select.options.length <= 2) {
+            load(null);
+        }
+    }, {once: true});
+});
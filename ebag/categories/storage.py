@@ -0,0 +1,67 @@
+import hashlib
+import os
+import posixpath
+import tempfile
+import threading
+import time
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Store every file under the SHA-256 digest of its content
+    ( 'categories/ab/abcdef...jpg' ), so identical uploads share one file
+
+    The digest is computed while the content is streamed to a temporary
+    file next to its destination, which is then moved into place - also
+    over the same content, so the file surely exists when _save returns and
+    its modification time tells it was just ( re )used
+    """
+    lock = threading.Lock()
+
+    def get_available_name(self, name, max_length=None):
+        # the final name is only known once the content is hashed
+        return name
+
+    def _save(self, name, content):
+        directory = posixpath.dirname(name)
+        extension = posixpath.splitext(name)[1].lower()
+        os.makedirs(self.path(directory), exist_ok=True)
+
+        digest = hashlib.sha256()
+        descriptor, temporary_path = tempfile.mkstemp(dir=self.path(directory), suffix='.part')
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    file.write(chunk)
+
+            digest = digest.hexdigest()
+            name = posixpath.join(directory, digest[:2], f'{digest}{extension}')
+            path = self.path(name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with self.lock:
+                os.replace(temporary_path, path)
+            if self.file_permissions_mode is not None:
+                os.chmod(path, self.file_permissions_mode)
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+
+        return name
+
+    def is_recent(self, name, seconds):
+        """
+        Whether the file was saved less than `seconds` ago
+        """
+        try:
+            return time.time() - os.path.getmtime(self.path(name)) < seconds
+        except FileNotFoundError:
+            return False
+
+
+category_image_storage = ContentAddressedStorage()
@@ -0,0 +1,196 @@
+import json
+import os
+import random
+from collections import Counter
+from io import StringIO
+
+from categories.models import Category, Similarity
+from categories.seeding import generate_category_parents, generate_component_pairs
+from categories.tests.utils import TemporaryMediaMixin, create_category, create_similarity
+from categories.utils import DisjointSet, get_category_islands, rebuild_category_islands, rebuild_category_paths
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+
+class DerivedColumnsMixin:
+
+    def assertDerivedColumns(self):
+        before = list(Category.objects.order_by('id').values_list('path', 'depth', 'island'))
+        rebuild_category_paths()
+        rebuild_category_islands()
+        after = list(Category.objects.order_by('id').values_list('path', 'depth', 'island'))
+        self.assertEqual(before, after)
+
+
+class ResetDbCommandTests(DerivedColumnsMixin, TestCase):
+
+    def test_command_reset_db(self):
+        call_command('reset_db', categories=10, similarities=10, stdout=StringIO())
+        self.assertEqual(Category.objects.count(), 11)
+        self.assertLessEqual(Similarity.objects.count(), 10)
+        self.assertDerivedColumns()
+
+    def test_command_reset_db_bulk(self):
+        call_command('reset_db', categories=100, similarities=100, bulk=True, batch_size=30, stdout=StringIO())
+        self.assertEqual(Category.objects.count(), 101)
+        self.assertLessEqual(Similarity.objects.count(), 100)
+        self.assertEqual(Category.objects.exclude(name=Category.ROOT_NAME).values('image').distinct().count(), 1)
+        self.assertDerivedColumns()
+
+        root_node = Category.objects.get(name=Category.ROOT_NAME)
+        islands = get_category_islands(root_node, 'by_name')
+        self.assertEqual(sum(len(it) for it in islands), 100)
+
+    def test_command_reset_db_batch_size_invalid(self):
+        for batch_size in [0, -1]:
+            with self.assertRaisesMessage(CommandError, 'Batch size must be at least 1.'):
+                call_command('reset_db', categories=10, bulk=True, batch_size=batch_size, stdout=StringIO())
+
+    def test_command_reset_db_shaped(self):
+        options = {
+            'categories': 200,
+            'depth': 4,
+            'branching': 8,
+            'skew': 0.5,
+            'density': 1.5,
+            'component_size': 10,
+            'seed': 42,
+            'stdout': StringIO(),
+        }
+        call_command('reset_db', **options)
+        self.assertEqual(Category.objects.count(), 201)
+        self.assertLessEqual(max(Category.objects.values_list('depth', flat=True)), 4)
+        self.assertDerivedColumns()
+
+        def shape():
+            return (
+                list(Category.objects.order_by('name').values_list('name', 'depth')),
+                sorted(Similarity.objects.values_list('node_one__name', 'node_two__name')),
+            )
+
+        expected = shape()
+        call_command('reset_db', **options)
+        self.assertEqual(shape(), expected)
+
+
+class CreateRenditionsCommandTests(TemporaryMediaMixin, TestCase):
+    media_settings = {'CATEGORIES_IMAGE_WIDTHS': [50]}
+
+    def test_command_create_renditions(self):
+        call_command('reset_db', categories=20, bulk=True, stdout=StringIO())
+        self.assertFalse(Category.objects.exclude(is_root=True).filter(renditions={}).exists())
+
+        Category.objects.update(renditions={})
+        output = StringIO()
+        call_command('create_renditions', stdout=output)
+        self.assertEqual(len(output.getvalue().splitlines()), 2)
+        self.assertFalse(Category.objects.filter(renditions={}).exists())
+        self.assertEqual(Category.objects.values('renditions').distinct().count(), 2)
+
+
+class TransferCommandTests(DerivedColumnsMixin, TemporaryMediaMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        root_node = create_category(Category.ROOT_NAME)
+        t1 = create_category('T1', root_node)
+        t2 = create_category('T2', t1)
+        t3 = create_category('T3', t2)
+        t4 = create_category('T4', root_node)
+        t1.parent = t4
+        t1.save()
+        create_similarity(t2, t4)
+        create_similarity(t3, t4)
+
+    @staticmethod
+    def get_catalogue():
+        categories = set(Category.objects.values_list('name', 'parent__name', 'depth', 'image'))
+        similarities = set(Similarity.objects.values_list('node_one__name', 'node_two__name'))
+        return categories, similarities, len(set(Category.objects.values_list('island', flat=True)))
+
+    def assertRoundTrip(self, file_name, **options):
+        path = os.path.join(self.media_root, file_name)
+        catalogue = self.get_catalogue()
+        call_command('export_categories', output=path, stdout=StringIO(), **options)
+        Category.objects.exclude(is_root=True).delete()
+
+        output = StringIO()
+        call_command('import_categories', path, stdout=output, **options)
+        self.assertIn('Category        4', output.getvalue())
+        self.assertEqual(self.get_catalogue(), catalogue)
+        self.assertDerivedColumns()
+
+    def test_command_export_import_ndjson(self):
+        self.assertRoundTrip('catalogue.ndjson')
+
+    def test_command_export_import_csv(self):
+        self.assertRoundTrip('catalogue.csv')
+        self.assertRoundTrip('catalogue.txt', format='csv')
+
+    def test_command_export_stdout(self):
+        output = StringIO()
+        call_command('export_categories', chunk_size=2, stdout=output)
+        records = [json.loads(it) for it in output.getvalue().splitlines()]
+        self.assertEqual([it['type'] for it in records], ['category'] * 4 + ['similarity'] * 2)
+        self.assertEqual([it['name'] for it in records[:4]], ['T4', 'T1', 'T2', 'T3'])
+        self.assertEqual(records[0]['parent_external_id'], '')
+
+    def assertImportError(self, records, message):
+        path = os.path.join(self.media_root, 'invalid.ndjson')
+        with open(path, 'w') as file:
+            file.writelines(json.dumps(it) + '\n' for it in records)
+        count = Category.objects.count()
+        with self.assertRaisesMessage(CommandError, message):
+            call_command('import_categories', path, stdout=StringIO())
+        self.assertEqual(Category.objects.count(), count)
+
+    def test_command_import_invalid(self):
+        image = Category.objects.get(name='T1').image.name
+        category = {'external_id': 'a', 'name': 'A', 'description': '', 'image_ref': image}
+        self.assertImportError([category, {**category, 'name': 'B'}], 'Line 2: duplicate external id "a".')
+        self.assertImportError([{**category, 'name': 'T1'}], 'Line 1: Category with this Name already exists.')
+        self.assertImportError([{**category, 'parent_external_id': 'b'}], 'Line 1: unknown parent "b".')
+        self.assertImportError([
+            {**category, 'parent_external_id': 'b'},
+            {**category, 'external_id': 'b', 'name': 'B', 'parent_external_id': 'a'},
+        ], 'Line 1: "a" is part of a parent cycle.')
+        self.assertImportError([{**category, 'image_ref': '../secret.jpg'}], 'The image "../secret.jpg" is not stored.')
+        self.assertImportError([
+            category,
+            {**category, 'external_id': 'b', 'name': 'B'},
+            {'type': 'similarity', 'node_one': 'a', 'node_two': 'b'},
+            {'type': 'similarity', 'node_one': 'b', 'node_two': 'a'},
+        ], 'Line 4: duplicate similarity b - a.')
+
+
+class SeedingTests(TestCase):
+
+    def test_seeding_category_parents_limits(self):
+        parents = generate_category_parents(500, max_depth=3, branching=8, rng=random.Random(1))
+        depths = [0]
+        for parent in parents:
+            depths.append(depths[parent] + 1)
+        self.assertLessEqual(max(depths), 3)
+        self.assertLessEqual(max(Counter(parents).values()), 8)
+
+        with self.assertRaises(ValueError):
+            generate_category_parents(100, max_depth=2, branching=3)
+
+    def test_seeding_category_parents_skew(self):
+        def depth(skew):
+            depths = [0]
+            for parent in generate_category_parents(1000, skew=skew, rng=random.Random(1)):
+                depths.append(depths[parent] + 1)
+            return max(depths)
+
+        self.assertLess(depth(0.0), 30)
+        self.assertEqual(depth(1.0), 1000)
+
+    def test_seeding_component_pairs(self):
+        pairs = generate_component_pairs(range(1000), 2.0, 20, 'fixed', random.Random(1))
+        islands = DisjointSet(range(1000))
+        for node_one, node_two in pairs:
+            self.assertLess(node_one, node_two)
+            islands.union(node_one, node_two)
+        self.assertEqual(sorted(len(it) for it in islands.groups()), [20] * 50)
+        self.assertEqual(len(pairs), 2000)
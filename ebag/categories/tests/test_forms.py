@@ -1,11 +1,25 @@
 import os
+import struct
+import zlib
 
 from categories.forms import CategoryManage, SimilarityManage
 from categories.models import Category, Similarity
 from categories.tests.utils import create_category, create_similarity
 from django.conf import settings
-from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import TestCase
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.template.defaultfilters import filesizeformat
+from django.test import TestCase, override_settings
+
+
+def png_header(width, height):
+    """
+    A PNG image of the given dimensions without any pixel data
+    """
+    def chunk(chunk_type, data):
+        return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(chunk_type + data))
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', b'') + chunk(b'IEND', b'')
 
 
 class CategoryManageFormTests(TestCase):
@@ -45,6 +59,54 @@ class CategoryManageFormTests(TestCase):
         self.assertFalse(form.is_valid())
 
 
+class CategoryImageFieldTests(TestCase):
+
+    def setUp(self):
+        self.root_node = create_category(Category.ROOT_NAME)
+        file_path = os.path.join(settings.BASE_DIR, 'categories', 'tests', 'files', 'cat01.jpg')
+        with open(file_path, 'rb') as file_upload:
+            self.content = file_upload.read()
+
+    def get_image_errors(self, image):
+        form = CategoryManage({'name': 'T1', 'description': 'test', 'parent': self.root_node.id}, {'image': image})
+        form.is_valid()
+        return form.errors.get('image')
+
+    def test_form_category_image_valid(self):
+        self.assertIsNone(self.get_image_errors(SimpleUploadedFile('cat.jpg', self.content)))
+
+    def test_form_category_image_spooled_to_disk(self):
+        image = TemporaryUploadedFile('cat.jpg', 'image/jpeg', len(self.content), None)
+        image.write(self.content)
+        self.assertIsNone(self.get_image_errors(image))
+        image.close()
+
+    @override_settings(CATEGORIES_IMAGE_MAX_BYTES=1000)
+    def test_form_category_image_too_many_bytes(self):
+        errors = self.get_image_errors(SimpleUploadedFile('cat.jpg', self.content))
+        size = filesizeformat(len(self.content))
+        self.assertEqual(errors, [f'The image file is too large ( {size}, the limit is 1000\xa0bytes ).'])
+
+    @override_settings(CATEGORIES_IMAGE_MAX_PIXELS=40000000)
+    def test_form_category_image_too_many_pixels(self):
+        # the headers claim the dimensions, with no pixel data to decode
+        errors = self.get_image_errors(SimpleUploadedFile('huge.png', png_header(8000, 6000)))
+        self.assertEqual(errors, ['The image is too large ( 8000 x 6000 pixels, the limit is 40000000 pixels ).'])
+
+        errors = self.get_image_errors(SimpleUploadedFile('bomb.png', png_header(50000, 50000)))
+        self.assertEqual(errors, ['The image is too large to be processed safely.'])
+
+    @override_settings(CATEGORIES_IMAGE_ALLOWED_FORMATS=['JPEG'])
+    def test_form_category_image_format(self):
+        errors = self.get_image_errors(SimpleUploadedFile('small.png', png_header(10, 10)))
+        self.assertEqual(errors, ['The image format PNG is not supported ( use JPEG ).'])
+
+    def test_form_category_image_invalid(self):
+        errors = self.get_image_errors(SimpleUploadedFile('cat.jpg', b'not an image'))
+        self.assertEqual(len(errors), 1)
+        self.assertTrue(errors[0].startswith('Upload a valid image.'))
+
+
 class SimilarityManageFormTests(TestCase):
 
     def setUp(self):
@@ -75,3 +137,10 @@ class SimilarityManageFormTests(TestCase):
         }
         form = SimilarityManage(data)
         self.assertFalse(form.is_valid())
+
+    def test_form_similarity_clean_single_query(self):
+        form = SimilarityManage({'node_one': self.test_node_2.id, 'node_two': self.test_node_1.id})
+        # both choices, both orientations of the pair, the model's foreign key checks
+        with self.assertNumQueries(5):
+            self.assertFalse(form.is_valid())
+        self.assertEqual(form.non_field_errors(), ['Such mirror Similarity already exists.'])
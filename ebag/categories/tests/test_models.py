@@ -1,6 +1,12 @@
-from categories.models import Category
-from categories.tests.utils import create_category, create_similarity
-from django.test import TestCase
+import os
+
+from categories.images import get_rendition_formats
+from categories.models import Category, get_subtree_filter, release_category_image
+from categories.tests.utils import TemporaryMediaMixin, create_category, create_similarity
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, transaction
+from django.test import TestCase, override_settings
+from PIL import Image
 
 
 class CategoryModelTests(TestCase):
@@ -23,6 +29,216 @@ class CategoryModelTests(TestCase):
         self.assertEqual(str(self.test_node), self.test_node.name)
         self.assertEqual(self.test_node.get_absolute_url(), '/categories/category/2/t-1-1/')
 
+    def test_model_category_root(self):
+        self.assertTrue(self.root_node.is_root)
+        self.assertFalse(self.test_node.is_root)
+        self.assertEqual(Category.objects.get_root(), self.root_node)
+        with self.assertNumQueries(1):
+            self.assertEqual(Category.objects.get_root_id(), self.root_node.id)
+
+        with transaction.atomic(), self.assertRaises(IntegrityError):
+            Category.objects.filter(id=self.test_node.id).update(is_root=True)
+
+        self.test_node.delete()
+        self.root_node.delete()
+        self.assertIsNone(Category.objects.get_root())
+        self.assertIsNone(Category.objects.get_root_id())
+
+        root_node = create_category(Category.ROOT_NAME)
+        self.assertEqual(Category.objects.get_root(), root_node)
+
+
+class CategoryRenditionModelTests(TemporaryMediaMixin, TestCase):
+    media_settings = {'CATEGORIES_IMAGE_WIDTHS': [50, 100, 400], 'CATEGORIES_IMAGE_FORMATS': ['webp', 'jpeg']}
+
+    def test_model_category_renditions(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            root_node = create_category(Category.ROOT_NAME)
+        self.assertEqual(root_node.renditions, {})
+
+        root_node.refresh_from_db()
+        self.assertEqual(list(root_node.renditions), get_rendition_formats())
+        self.assertEqual(list(root_node.renditions['jpeg']), ['50', '100'])
+        for image_format, widths in root_node.renditions.items():
+            for width, name in widths.items():
+                with root_node.image.storage.open(name) as file, Image.open(file) as image:
+                    self.assertEqual((image.format.lower(), image.width), (image_format, int(width)))
+
+        jpeg = root_node.renditions['jpeg']
+        self.assertEqual(root_node.image_srcset['jpeg'], f'/media/{jpeg["50"]} 50w, /media/{jpeg["100"]} 100w')
+
+    def test_model_category_renditions_scheduled_on_commit(self):
+        with override_settings(CATEGORIES_IMAGE_SYNC=False), self.captureOnCommitCallbacks() as callbacks:
+            root_node = create_category(Category.ROOT_NAME)
+            root_node.name = 'root'
+            root_node.save()
+        # only a new image schedules renditions, and only after the commit
+        callbacks = [it for it in callbacks if 'update_renditions' in it.__code__.co_names]
+        self.assertEqual(len(callbacks), 1)
+
+
+class CategoryImageStorageModelTests(TemporaryMediaMixin, TestCase):
+    media_settings = {'CATEGORIES_IMAGE_WIDTHS': [50], 'CATEGORIES_IMAGE_RELEASE_GRACE': 0}
+
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.root_node = create_category(Category.ROOT_NAME)
+            self.test_node_1 = create_category('T1', self.root_node)
+            self.test_node_2 = create_category('T2', self.root_node)
+        for node in [self.root_node, self.test_node_1, self.test_node_2]:
+            node.refresh_from_db()
+        self.storage = self.root_node.image.storage
+
+    def assertStored(self, node, stored=True):
+        names = [node.image.name] + [it for widths in node.renditions.values() for it in widths.values()]
+        for name in names:
+            self.assertEqual(self.storage.exists(name), stored, name)
+
+    def test_model_category_image_deduplicated(self):
+        self.assertEqual(self.test_node_1.image.name, self.test_node_2.image.name)
+        self.assertNotEqual(self.test_node_1.image.name, self.root_node.image.name)
+        self.assertRegex(self.test_node_1.image.name, r'^categories/([0-9a-f]{2})/\1[0-9a-f]{62}\.jpg$')
+        self.assertEqual(self.test_node_1.renditions, self.test_node_2.renditions)
+        directory = os.path.dirname(self.test_node_1.image.path)
+        self.assertEqual([it for it in os.listdir(directory) if os.path.isfile(os.path.join(directory, it))], [
+            os.path.basename(self.test_node_1.image.name),
+        ])
+
+    def test_model_category_image_deleted_when_unused(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.test_node_1.delete()
+        self.assertStored(self.test_node_2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.test_node_2.delete()
+        self.assertStored(self.test_node_2, stored=False)
+        self.assertStored(self.root_node)
+
+    @override_settings(CATEGORIES_IMAGE_RELEASE_GRACE=60)
+    def test_model_category_image_kept_when_recently_saved(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.test_node_1.delete()
+            self.test_node_2.delete()
+        self.assertStored(self.test_node_2)
+
+        image = self.storage.path(self.test_node_2.image.name)
+        os.utime(image, (os.path.getatime(image), os.path.getmtime(image) - 120))
+        with self.captureOnCommitCallbacks(execute=True):
+            release_category_image(self.test_node_2.image.name, self.test_node_2.renditions)
+        self.assertStored(self.test_node_2, stored=False)
+
+    def test_model_category_image_replaced(self):
+        castle, cat = self.root_node.image.name, self.test_node_1.image.name
+        with self.captureOnCommitCallbacks(execute=True):
+            self.root_node.image = SimpleUploadedFile('cat.jpg', self.storage.open(cat).read())
+            self.root_node.save()
+            self.test_node_1.image = SimpleUploadedFile('castle.jpg', self.storage.open(castle).read())
+            self.test_node_1.save()
+        self.assertEqual((self.root_node.image.name, self.test_node_1.image.name), (cat, castle))
+        self.assertTrue(self.storage.exists(castle))
+        self.assertTrue(self.storage.exists(cat))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.test_node_1.image = SimpleUploadedFile('cat.jpg', self.storage.open(cat).read())
+            self.test_node_1.save()
+        self.assertFalse(self.storage.exists(castle))
+
+
+class CategoryPathModelTests(TestCase):
+
+    def setUp(self):
+        self.root_node = create_category(Category.ROOT_NAME)
+        self.test_node_1 = create_category('T1', self.root_node)
+        self.test_node_2 = create_category('T2', self.test_node_1)
+        self.test_node_3 = create_category('T3', self.test_node_2)
+
+    def assertPath(self, node, *parents):
+        node.refresh_from_db()
+        expected = ''.join(f'/{it.id}' for it in parents + (node,)) + '/'
+        self.assertEqual(node.path, expected)
+        self.assertEqual(node.depth, len(parents))
+
+    def test_model_category_path_initial(self):
+        self.assertPath(self.root_node)
+        self.assertPath(self.test_node_1, self.root_node)
+        self.assertPath(self.test_node_2, self.root_node, self.test_node_1)
+        self.assertPath(self.test_node_3, self.root_node, self.test_node_1, self.test_node_2)
+
+    def test_model_category_path_on_parent_change(self):
+        self.test_node_2.parent = self.root_node
+        self.test_node_2.save()
+        self.assertPath(self.test_node_1, self.root_node)
+        self.assertPath(self.test_node_2, self.root_node)
+        self.assertPath(self.test_node_3, self.root_node, self.test_node_2)
+
+    def test_model_category_path_move_under_descendant_refused(self):
+        self.test_node_1.parent = self.test_node_3
+        with self.assertRaisesMessage(ValueError, Category.MOVE_ERROR):
+            self.test_node_1.save()
+        self.test_node_1.refresh_from_db()
+        self.assertPath(self.test_node_1, self.root_node)
+        self.assertPath(self.test_node_3, self.root_node, self.test_node_1, self.test_node_2)
+
+    def test_model_category_path_subtree_filter(self):
+        subtree = Category.objects.filter(get_subtree_filter(self.test_node_1.path))
+        self.assertEqual(set(subtree), {self.test_node_1, self.test_node_2, self.test_node_3})
+        sibling = create_category('T10', self.root_node)
+        Category.objects.filter(id=sibling.id).update(path=f'{self.test_node_1.path[:-1]}0/')
+        self.assertNotIn(sibling, Category.objects.filter(get_subtree_filter(self.test_node_1.path)))
+
+    def test_model_category_path_on_node_deletion(self):
+        self.test_node_1.delete()
+        self.assertPath(self.test_node_2, self.root_node)
+        self.assertPath(self.test_node_3, self.root_node, self.test_node_2)
+
+    def test_model_category_path_on_nested_deletion(self):
+        test_node_4 = create_category('T4', self.test_node_3)
+        Category.objects.filter(id__in=[self.test_node_1.id, self.test_node_3.id]).delete()
+        self.assertPath(self.test_node_2, self.root_node)
+        self.assertPath(test_node_4, self.root_node)
+
+
+class CategoryIslandModelTests(TestCase):
+
+    def setUp(self):
+        self.root_node = create_category(Category.ROOT_NAME)
+        self.test_nodes = [create_category(f'T{i}', self.root_node) for i in range(1, 5)]
+
+    def assertIslands(self, *islands):
+        for island in islands:
+            label = min(it.id for it in island)
+            for node in island:
+                node.refresh_from_db()
+                self.assertEqual(node.island, label)
+
+    def test_model_category_island_initial(self):
+        self.root_node.refresh_from_db()
+        self.assertIsNone(self.root_node.island)
+        self.assertIslands(*[[it] for it in self.test_nodes])
+
+    def test_model_category_island_on_similarity_change(self):
+        t1, t2, t3, t4 = self.test_nodes
+        create_similarity(t1, t2)
+        similarity = create_similarity(t2, t3)
+        self.assertIslands([t1, t2, t3], [t4])
+
+        similarity.node_one = t4
+        similarity.save()
+        self.assertIslands([t1, t2], [t3, t4])
+
+        similarity.delete()
+        self.assertIslands([t1, t2], [t3], [t4])
+
+    def test_model_category_island_on_node_deletion(self):
+        t1, t2, t3, t4 = self.test_nodes
+        create_similarity(t1, t2)
+        create_similarity(t2, t3)
+        create_similarity(t3, t4)
+
+        t2.delete()
+        self.assertIslands([t1], [t3, t4])
+
 
 class SimilarityModelTests(TestCase):
 
@@ -42,3 +258,10 @@ class SimilarityModelTests(TestCase):
         self.test_similarity.save()
         self.assertEqual(str(self.test_similarity), f'{self.test_node_2} - {self.test_node_1}')
         self.assertEqual(self.test_similarity.get_absolute_url(), '/categories/similarity/1/')
+
+    def test_model_similarity_pair(self):
+        self.assertEqual(self.test_similarity.pair, f'{self.test_node_1.id}-{self.test_node_2.id}')
+        with transaction.atomic(), self.assertRaises(IntegrityError):
+            create_similarity(self.test_node_2, self.test_node_1)
+        with transaction.atomic(), self.assertRaises(IntegrityError):
+            create_similarity(self.test_node_1, self.test_node_1)
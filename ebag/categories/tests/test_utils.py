@@ -1,14 +1,24 @@
+import random
+import tempfile
+
 from categories.models import Category
 from categories.tests.utils import create_category, create_similarity
 from categories.utils import (
+    DisjointSet,
+    Graph,
+    get_category_context,
+    get_category_graph_version,
     get_category_islands,
+    get_category_islands_to_string,
     get_category_nodes,
     get_category_parents,
     get_category_siblings,
     get_category_similarities,
     get_category_tree,
+    get_category_tree_to_string,
+    node_to_string,
 )
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
 
 def set_relations():
@@ -146,6 +156,31 @@ class GetCategoryParentsTests(TestCase):
         expected = [self.categories[0], self.categories[2]]
         self.assertEqual(calculated, expected)
 
+    def test_get_category_parents_single_query(self):
+        with self.assertNumQueries(1):
+            get_category_parents(self.categories[6])
+
+
+class GetCategoryContextTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.categories = set_relations()
+
+    def test_get_category_context_matches_helpers(self):
+        for node in Category.objects.all():
+            with self.assertNumQueries(2):
+                calculated = get_category_context.__wrapped__(node)
+            expected = {
+                'category_island': get_category_islands_to_string.__wrapped__(node),
+                'category_nodes': get_category_nodes(node),
+                'category_parents': get_category_parents(node),
+                'category_siblings': get_category_siblings(node),
+                'category_similarities': get_category_similarities(node),
+                'category_tree': get_category_tree_to_string.__wrapped__(node),
+            }
+            self.assertEqual(calculated, expected)
+
 
 class GetCategorySiblingsTests(TestCase):
 
@@ -327,6 +362,44 @@ class CategoryTreeBehaviorTests(TestCase):
         }
         self.assertEqual(calculated, expected)
 
+    def test_behavior_category_tree_by_link(self):
+        self.categories[2].parent = self.categories[1]
+        self.categories[2].save()
+
+        calculated = get_category_tree(self.categories[1], 'by_link')
+        expected = {
+            node_to_string(self.categories[1], 'by_link'): {
+                node_to_string(self.categories[2], 'by_link'): {},
+            },
+        }
+        self.assertEqual(calculated, expected)
+
+    def test_behavior_category_tree_single_query(self):
+        for i in range(6, 16):
+            create_category(f'Category {i}', random.choice(self.categories))
+
+        with self.assertNumQueries(1):
+            get_category_tree(self.categories[0], 'by_name')
+
+    def test_behavior_category_tree_to_string(self):
+        self.categories[2].parent = self.categories[1]
+        self.categories[2].save()
+        create_category('A & <B>', self.categories[1])
+
+        calculated = get_category_tree_to_string(self.categories[1])
+        indent = '&nbsp;' * 4
+        node_1, node_2 = (node_to_string(it, 'by_link') for it in self.categories[1:3])
+        node_3 = node_to_string(Category.objects.get(slug='a-b'), 'by_link')
+        self.assertIn('A &amp; &lt;B&gt;', node_3)
+        expected = '\n'.join([
+            '{',
+            f'{indent}{node_1}: {{',
+            *sorted([f'{indent * 2}{node_2}', f'{indent * 2}{node_3}']),
+            f'{indent}}}',
+            '}',
+        ])
+        self.assertEqual(calculated, expected)
+
 
 class CategoryIslandsBehaviorTests(TestCase):
 
@@ -380,3 +453,98 @@ class CategoryIslandsBehaviorTests(TestCase):
             ],
         ]
         self.assertEqual(calculated, expected)
+
+    def test_behavior_category_islands_from_node(self):
+        create_similarity(self.categories[1], self.categories[2])
+        create_similarity(self.categories[2], self.categories[3])
+
+        calculated = get_category_islands(self.categories[3], 'by_name')
+        expected = [
+            [
+                self.categories[1].name,
+                self.categories[2].name,
+                self.categories[3].name,
+            ],
+        ]
+        self.assertEqual(calculated, expected)
+
+        calculated = get_category_islands(self.categories[4], 'by_name')
+        expected = [[self.categories[4].name]]
+        self.assertEqual(calculated, expected)
+
+
+class DisjointSetTests(TestCase):
+
+    def test_disjoint_set_groups(self):
+        islands = DisjointSet(range(6))
+        islands.union(0, 1)
+        islands.union(2, 3)
+        islands.union(3, 1)
+        calculated = sorted(sorted(it) for it in islands.groups())
+        expected = [[0, 1, 2, 3], [4], [5]]
+        self.assertEqual(calculated, expected)
+
+
+class GraphTests(TestCase):
+
+    def test_graph_connected_components_order(self):
+        graph = Graph(6)
+        graph.add_edge(0, 3)
+        graph.add_edge(0, 1)
+        graph.add_edge(1, 2)
+        graph.add_edge(3, 4)
+        calculated = graph.connected_components()
+        expected = [[0, 3, 4, 1, 2], [5]]
+        self.assertEqual(calculated, expected)
+
+    def test_graph_connected_components_deep_chain(self):
+        vertex = 100000
+        graph = Graph(vertex)
+        for i in range(1, vertex):
+            graph.add_edge(i - 1, i)
+        calculated = graph.connected_components()
+        expected = [list(range(vertex))]
+        self.assertEqual(calculated, expected)
+
+
+class CategoryGraphCacheTests(TestCase):
+
+    def setUp(self):
+        self.root_node = create_category(Category.ROOT_NAME)
+        self.test_node_1 = create_category('T1', self.root_node)
+        self.test_node_2 = create_category('T2', self.root_node)
+
+    def assertCached(self):
+        tree = get_category_tree_to_string(self.root_node)
+        islands = get_category_islands_to_string(self.root_node)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_category_tree_to_string(self.root_node), tree)
+            self.assertEqual(get_category_islands_to_string(self.root_node), islands)
+
+        create_similarity(self.test_node_1, self.test_node_2)
+        self.assertNotEqual(get_category_islands_to_string(self.root_node), islands)
+
+        self.test_node_2.parent = self.test_node_1
+        self.test_node_2.save()
+        self.assertNotEqual(get_category_tree_to_string(self.root_node), tree)
+
+    def test_cache_category_graph_version_bumped_on_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.test_node_2.parent = self.test_node_1
+            self.test_node_2.save()
+        version = get_category_graph_version()
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(get_category_graph_version(), version)
+
+    def test_cache_category_graph_locmem(self):
+        with override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        }):
+            self.assertCached()
+
+    def test_cache_category_graph_file_based(self):
+        with tempfile.TemporaryDirectory() as location, override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location},
+        }):
+            self.assertCached()
@@ -1,12 +1,16 @@
+import json
 import os
 import random
 
 from categories.models import Category, Similarity
 from categories.tests.utils import create_category, create_similarity
+from categories.utils import get_category_tree_to_string
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import TestCase
+from django.template.defaultfilters import linebreaksbr
+from django.test import TestCase, override_settings
 from django.urls import reverse
+from django.utils.safestring import mark_safe
 
 
 class IndexViewTests(TestCase):
@@ -37,6 +41,7 @@ class IndexViewTests(TestCase):
         self.assertEqual(response.context['similarity_count'], 1)
         self.assertNotEqual(response.context['category_root_tree'], '')
         self.assertNotEqual(response.context['category_root_islands'], '')
+        self.assertContains(response, reverse('categories:category_tree', args=[root_node.id, root_node.slug]))
 
 
 class CategoryListViewTests(TestCase):
@@ -118,6 +123,23 @@ class CategoryDisplayViewTests(TestCase):
         self.assertEqual(response.status_code, 200)
 
 
+class CategoryTreeViewTests(TestCase):
+
+    def setUp(self):
+        self.root_node = create_category(Category.ROOT_NAME)
+        self.test_node_1 = create_category('T1', self.root_node)
+        self.test_node_2 = create_category('T2', self.test_node_1)
+
+    def test_view_category_tree(self):
+        link = reverse('categories:category_tree', args=[self.root_node.id, self.root_node.slug])
+        response = self.client.get(link)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode()
+        self.assertEqual(content, linebreaksbr(mark_safe(get_category_tree_to_string(self.root_node))))
+        self.assertIn(self.test_node_2.get_absolute_url(), content)
+
+
 class CategoryUpdateViewTests(TestCase):
 
     def setUp(self):
@@ -171,6 +193,52 @@ class CategoryUpdateViewTests(TestCase):
         self.assertFormError(response, 'form', 'parent', error_message)
 
 
+class CategorySearchViewTests(TestCase):
+
+    def setUp(self):
+        self.root_node = create_category(Category.ROOT_NAME)
+        self.test_node_1 = create_category('Tea', self.root_node)
+        self.test_node_2 = create_category('Tea Green', self.test_node_1)
+        self.test_node_3 = create_category('Team', self.root_node)
+        self.test_node_4 = create_category('Coffee', self.root_node)
+
+    def search(self, **params):
+        response = self.client.get(reverse('categories:category_search'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_view_category_search_prefix(self):
+        create_category('Teb', self.root_node)
+        data = self.search(q=' TEA ')
+        self.assertEqual([it['text'] for it in data['results']], ['Tea', 'Tea Green', 'Team'])
+        self.assertIsNone(data['next'])
+
+    def test_view_category_search_pages(self):
+        data = self.search(q='tea', page_size=2)
+        self.assertEqual([it['id'] for it in data['results']], [self.test_node_1.id, self.test_node_2.id])
+        self.assertEqual(data['next'], self.test_node_2.slug)
+
+        data = self.search(q='tea', page_size=2, after=data['next'])
+        self.assertEqual([it['id'] for it in data['results']], [self.test_node_3.id])
+        self.assertIsNone(data['next'])
+
+    def test_view_category_search_exclude_tree(self):
+        data = self.search(q='tea', exclude=self.test_node_1.id)
+        self.assertEqual([it['text'] for it in data['results']], ['Team'])
+
+    def test_view_category_search_exclude_root(self):
+        self.assertEqual([it['text'] for it in self.search(q='ro')['results']], [Category.ROOT_NAME])
+        self.assertEqual(self.search(q='ro', root=0)['results'], [])
+
+    def test_view_category_update_renders_selected_parent_only(self):
+        link_update = reverse('categories:category_update', args=[self.test_node_2.id, self.test_node_2.slug])
+        response = self.client.get(link_update)
+        search_url = reverse('categories:category_search')
+        self.assertContains(response, f'data-autocomplete-url="{search_url}?exclude={self.test_node_2.id}"')
+        self.assertContains(response, f'<option value="{self.test_node_1.id}" selected>Tea</option>', html=True)
+        self.assertNotContains(response, 'Coffee')
+
+
 class CategoryDeleteViewTests(TestCase):
 
     def setUp(self):
@@ -348,6 +416,15 @@ class SimilarityUpdateViewTests(TestCase):
         error_message = 'Such mirror Similarity already exists.'
         self.assertFormError(response, 'form', None, error_message)
 
+    def test_view_similarity_update_renders_selected_nodes_only(self):
+        link_update = reverse('categories:similarity_update', args=[self.test_similarity_1.id])
+        response = self.client.get(link_update)
+        search_url = reverse('categories:category_search')
+        self.assertContains(response, f'data-autocomplete-url="{search_url}?root=0"', count=2)
+        self.assertContains(response, f'<option value="{self.test_node_1.id}" selected>T1</option>', html=True)
+        self.assertContains(response, f'<option value="{self.test_node_2.id}" selected>T2</option>', html=True)
+        self.assertNotContains(response, 'T3')
+
 
 class SimilarityDeleteViewTests(TestCase):
 
@@ -444,3 +521,450 @@ class RandomDatabaseViewsTests(TestCase):
             link = similarity.get_absolute_url()
             response = self.client.get(link)
             self.assertEqual(response.status_code, 200)
+
+
+class CategoryTreeRestViewTests(TestCase):
+
+    def setUp(self):
+        self.root_node = create_category(Category.ROOT_NAME)
+        self.test_nodes = [create_category(f'T{i}', self.root_node) for i in range(1, 6)]
+        self.test_leaf = create_category('T1 1', self.test_nodes[0])
+
+    def test_view_rest_category_tree_depth(self):
+        link = f'/rest/categories/{self.root_node.id}/tree/'
+        response = self.client.get(link)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['child_count'], 5)
+        self.assertEqual(len(response.data['children']), 5)
+        self.assertNotIn('children', response.data['children'][0])
+        self.assertEqual(response.data['children'][0]['child_count'], 1)
+        self.assertIsNone(response.data['next'])
+
+        response = self.client.get(link, {'depth': 2})
+        leaf = {'id': self.test_leaf.id, 'name': self.test_leaf.name, 'child_count': 0}
+        self.assertEqual(response.data['children'][0]['children'], [leaf])
+
+    def test_view_rest_category_tree_cursor(self):
+        link = f'/rest/categories/{self.root_node.id}/tree/'
+        children = []
+        with self.assertNumQueries(2):
+            response = self.client.get(link, {'depth': 2, 'page_size': 2})
+        while True:
+            self.assertLessEqual(len(response.data['children']), 2)
+            children.extend(response.data['children'])
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+
+        self.assertEqual(sorted(it['id'] for it in children), [it.id for it in self.test_nodes])
+        self.assertEqual(sum(len(it['children']) for it in children), 1)
+
+    def test_view_rest_category_tree_invalid_cursor(self):
+        link = f'/rest/categories/{self.root_node.id}/tree/'
+        response = self.client.get(link, {'cursor': 'invalid'})
+        self.assertEqual(response.status_code, 404)
+
+
+class CategoryRestViewTests(TestCase):
+
+    def setUp(self):
+        self.root_node = create_category(Category.ROOT_NAME)
+        self.test_nodes = [create_category(f'T{i}', self.root_node) for i in range(1, 6)]
+
+    def test_view_rest_category_list_cursor(self):
+        link = '/rest/categories/'
+        names = []
+        response = self.client.get(link, {'page_size': 2})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 2)
+            names.extend(it['name'] for it in response.data['results'])
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+
+        expected = [it.name for it in reversed([self.root_node] + self.test_nodes)]
+        self.assertEqual(names, expected)
+
+    def test_view_rest_category_list_sparse_fields(self):
+        response = self.client.get('/rest/categories/', {'fields': 'name,parent'})
+        self.assertEqual(set(response.data['results'][0]), {'name', 'parent'})
+        self.assertTrue(response.data['results'][0]['parent'].startswith('http'))
+
+        response = self.client.get('/rest/categories/', {'fields': 'id,parent', 'relations': 'pk'})
+        self.assertEqual(response.data['results'][0], {'id': self.test_nodes[-1].id, 'parent': self.root_node.id})
+
+    def test_view_rest_category_update_not_valid_due_to_parent_cycle(self):
+        test_node_6 = create_category('T6', self.test_nodes[0])
+        test_node_7 = create_category('T7', test_node_6)
+        data = json.dumps({'parent': test_node_7.id})
+        response = self.client.patch(
+            f'/rest/categories/{self.test_nodes[0].id}/?relations=pk', data, content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['parent'], [Category.MOVE_ERROR])
+
+        link = f'/rest/categories/{test_node_6.id}/'
+        data = json.dumps({'parent': f'http://testserver{link}'})
+        response = self.client.patch(link, data, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Category.objects.get(id=test_node_6.id).parent, self.test_nodes[0])
+
+    def test_view_rest_category_update_not_valid_due_to_name(self):
+        link = f'/rest/categories/{self.test_nodes[0].id}/?relations=pk'
+        cases = [
+            ('T2', 'Category with this Name already exists.'),
+            ('T#1', 'The Name must be Alphanumeric.'),
+            (' Root ', 'The Root category cannot be created or renamed.'),
+        ]
+        for name, message in cases:
+            response = self.client.patch(link, json.dumps({'name': name}), content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.data['name'], [message])
+
+        response = self.client.patch(link, json.dumps({'name': ' T1 '}), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['name'], 'T1')
+
+    @override_settings(CATEGORIES_IMAGE_ALLOWED_FORMATS=['PNG'])
+    def test_view_rest_category_create_image_checked(self):
+        file_path = os.path.join(settings.BASE_DIR, 'categories', 'tests', 'files', 'cat01.jpg')
+        with open(file_path, 'rb') as file_upload:
+            data = {'name': 'T6', 'description': 'test', 'image': file_upload}
+            response = self.client.post('/rest/categories/?relations=pk', data)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['image'], ['The image format JPEG is not supported ( use PNG ).'])
+
+
+class SimilarityRestViewTests(TestCase):
+
+    def setUp(self):
+        self.root_node = create_category(Category.ROOT_NAME)
+        self.test_node_1 = create_category('T1', self.root_node)
+        self.test_node_2 = create_category('T2', self.root_node)
+        self.test_node_3 = create_category('T3', self.root_node)
+        self.similarity = create_similarity(self.test_node_1, self.test_node_2)
+
+    def test_view_rest_similarity_create_not_valid(self):
+        link = '/rest/similarities/?relations=pk'
+        cases = [
+            ((self.test_node_1, self.test_node_2), 'Such similar Similarity already exists.'),
+            ((self.test_node_2, self.test_node_1), 'Such mirror Similarity already exists.'),
+            ((self.test_node_3, self.test_node_3), 'First and second Nodes cannot be the same.'),
+        ]
+        for (node_one, node_two), message in cases:
+            response = self.client.post(link, {'node_one': node_one.id, 'node_two': node_two.id})
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.data['non_field_errors'], [message])
+        self.assertEqual(Similarity.objects.count(), 1)
+
+    def test_view_rest_similarity_update(self):
+        link = f'/rest/similarities/{self.similarity.id}/?relations=pk'
+        response = self.client.patch(link, {'node_one': self.test_node_2.id}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['non_field_errors'], ['First and second Nodes cannot be the same.'])
+
+        data = {'node_one': self.test_node_2.id, 'node_two': self.test_node_1.id}
+        response = self.client.put(link, data, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Similarity.objects.get(id=self.similarity.id).pair, self.similarity.pair)
+
+
+class CategoryTransferRestViewTests(TestCase):
+
+    def setUp(self):
+        self.root_node = create_category(Category.ROOT_NAME)
+        self.test_node_1 = create_category('T1', self.root_node)
+        self.test_node_2 = create_category('T2', self.test_node_1)
+        create_similarity(self.test_node_1, self.test_node_2)
+
+    def export(self, file_format):
+        response = self.client.get('/rest/categories/export/', {'file_format': file_format})
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_view_rest_category_export(self):
+        lines = self.export('ndjson').decode().splitlines()
+        self.assertEqual([json.loads(it)['type'] for it in lines], ['category', 'category', 'similarity'])
+
+        lines = self.export('csv').decode().splitlines()
+        self.assertEqual(lines[0], 'type,external_id,name,parent_external_id,description,image_ref,node_one,node_two')
+        self.assertEqual(len(lines), 4)
+
+        response = self.client.get('/rest/categories/export/', {'file_format': 'xml'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_view_rest_category_import(self):
+        content = self.export('csv').replace(b'T1', b'I1').replace(b'T2', b'I2')
+        upload = SimpleUploadedFile('catalogue.csv', content)
+        response = self.client.post('/rest/categories/import/', {'file': upload})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data, {'categories': 2, 'similarities': 1})
+        self.assertEqual(Category.objects.get(name='I2').parent.name, 'I1')
+
+        upload = SimpleUploadedFile('catalogue.csv', content)
+        response = self.client.post('/rest/categories/import/', {'file': upload})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['file'], ['Line 2: Category with this Name already exists.'])
+
+
+class BulkRestViewTests(TestCase):
+
+    def setUp(self):
+        self.root_node = create_category(Category.ROOT_NAME)
+        self.test_node_1 = create_category('T1', self.root_node)
+        self.test_node_2 = create_category('T2', self.test_node_1)
+        self.test_node_3 = create_category('T3', self.root_node)
+        self.image_ref = self.test_node_1.image.name
+
+    def bulk(self, link, method, data):
+        return getattr(self.client, method)(link, json.dumps(data), content_type='application/json')
+
+    def assertTreeConsistent(self):
+        for category in Category.objects.select_related('parent'):
+            if category.parent:
+                self.assertEqual(category.path, f'{category.parent.path}{category.id}/')
+                self.assertEqual(category.depth, category.parent.depth + 1)
+
+    def test_view_rest_category_bulk_create(self):
+        data = [
+            {'name': 'B1', 'description': 'test', 'image_ref': self.image_ref},
+            {'name': 'B2', 'description': 'test', 'image_ref': self.image_ref, 'parent': self.test_node_2.id},
+        ]
+        response = self.bulk('/rest/categories/bulk/', 'post', data)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([it['index'] for it in response.data['results']], [0, 1])
+
+        created = Category.objects.get(id=response.data['results'][1]['id'])
+        self.assertEqual(created.name, 'B2')
+        self.assertEqual(created.path, f'{self.test_node_2.path}{created.id}/')
+        self.assertEqual(created.renditions, self.test_node_1.renditions)
+        self.assertEqual(Category.objects.get(name='B1').parent, self.root_node)
+
+    def test_view_rest_category_bulk_create_not_valid(self):
+        data = [
+            {'name': 'B1', 'description': 'test', 'image_ref': self.image_ref},
+            {'name': 'T1', 'description': 'test', 'image_ref': 'categories/missing.jpg'},
+            {'name': 'b1', 'description': 'test', 'image_ref': self.image_ref, 'parent': 0},
+        ]
+        response = self.bulk('/rest/categories/bulk/', 'post', data)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['results'], [
+            {'index': 1, 'errors': {
+                'name': ['Category with this Name already exists.'],
+                'image_ref': ['The image "categories/missing.jpg" is not stored.'],
+            }},
+            {'index': 2, 'errors': {
+                'name': ['Category with this Name already exists.'],
+                'parent': ['Unknown category.'],
+            }},
+        ])
+        self.assertEqual(Category.objects.count(), 4)
+
+        response = self.bulk('/rest/categories/bulk/', 'post', {'name': 'B1'})
+        self.assertEqual(response.status_code, 400)
+
+        data = [
+            {'name': 'B1', 'description': 'test', 'image_ref': ['x']},
+            {'name': 'B2', 'description': 'test', 'image_ref': 5},
+        ]
+        response = self.bulk('/rest/categories/bulk/', 'post', data)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['results'], [
+            {'index': 0, 'errors': {'image_ref': ['A valid string is required.']}},
+            {'index': 1, 'errors': {'image_ref': ['A valid string is required.']}},
+        ])
+
+    def test_view_rest_category_bulk_update(self):
+        data = [
+            {'id': self.test_node_1.id, 'parent': self.test_node_3.id},
+            {'id': self.test_node_2.id, 'name': 'T2 renamed', 'parent': None},
+            {'id': self.test_node_3.id, 'description': 'changed'},
+        ]
+        response = self.bulk('/rest/categories/bulk/', 'patch', data)
+        self.assertEqual(response.status_code, 200)
+
+        test_node_2 = Category.objects.get(id=self.test_node_2.id)
+        self.assertEqual((test_node_2.slug, test_node_2.parent), ('t2-renamed', self.root_node))
+        self.assertEqual(Category.objects.get(id=self.test_node_1.id).parent, self.test_node_3)
+        self.assertEqual(Category.objects.get(id=self.test_node_3.id).description, 'changed')
+        self.assertTreeConsistent()
+
+    def test_view_rest_category_bulk_update_not_valid_due_to_parent_cycle(self):
+        data = [
+            {'id': self.test_node_1.id, 'parent': self.test_node_3.id},
+            {'id': self.test_node_3.id, 'parent': self.test_node_2.id},
+            {'id': self.root_node.id, 'description': 'changed'},
+        ]
+        response = self.bulk('/rest/categories/bulk/', 'patch', data)
+        self.assertEqual(response.status_code, 400)
+        message = 'A category cannot be moved under itself or its sub categories.'
+        self.assertEqual(response.data['results'], [
+            {'index': 0, 'errors': {'parent': [message]}},
+            {'index': 1, 'errors': {'parent': [message]}},
+            {'index': 2, 'errors': {'id': ['The Root category cannot be changed.']}},
+        ])
+        self.assertEqual(Category.objects.get(id=self.test_node_1.id).parent, self.root_node)
+
+    def test_view_rest_category_bulk_delete(self):
+        test_node_4 = create_category('T4', self.test_node_2)
+        create_similarity(self.test_node_3, test_node_4)
+        create_similarity(self.test_node_1, test_node_4)
+
+        response = self.bulk('/rest/categories/bulk/', 'delete', [self.test_node_1.id, self.test_node_2.id])
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Category.objects.filter(id__in=[self.test_node_1.id, self.test_node_2.id]).exists())
+
+        test_node_4.refresh_from_db()
+        self.assertEqual((test_node_4.parent, test_node_4.depth), (self.root_node, 1))
+        self.assertEqual(test_node_4.island, self.test_node_3.id)
+        self.assertTreeConsistent()
+
+        response = self.bulk('/rest/categories/bulk/', 'delete', [self.root_node.id, 'x'])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([it['index'] for it in response.data['results']], [0, 1])
+
+    def test_view_rest_similarity_bulk_create(self):
+        data = [
+            {'node_one': self.test_node_1.id, 'node_two': self.test_node_2.id},
+            {'node_one': self.test_node_2.id, 'node_two': self.test_node_3.id},
+        ]
+        response = self.bulk('/rest/similarities/bulk/', 'post', data)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            [it['id'] for it in response.data['results']],
+            list(Similarity.objects.order_by('id').values_list('id', flat=True)),
+        )
+        islands = set(Category.objects.exclude(is_root=True).values_list('island', flat=True))
+        self.assertEqual(islands, {self.test_node_1.id})
+
+    def test_view_rest_similarity_bulk_create_not_valid_due_to_duplication(self):
+        create_similarity(self.test_node_1, self.test_node_2)
+        data = [
+            {'node_one': self.test_node_1.id, 'node_two': self.test_node_2.id},
+            {'node_one': self.test_node_2.id, 'node_two': self.test_node_1.id},
+            {'node_one': self.test_node_3.id, 'node_two': self.test_node_2.id},
+            {'node_one': self.test_node_2.id, 'node_two': self.test_node_3.id},
+            {'node_one': self.test_node_3.id, 'node_two': self.test_node_3.id},
+            {'node_one': self.root_node.id, 'node_two': self.test_node_3.id},
+        ]
+        with self.assertNumQueries(4):
+            response = self.bulk('/rest/similarities/bulk/', 'post', data)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['results'], [
+            {'index': 0, 'errors': {'non_field_errors': ['Such similar Similarity already exists.']}},
+            {'index': 1, 'errors': {'non_field_errors': ['Such mirror Similarity already exists.']}},
+            {'index': 3, 'errors': {'non_field_errors': ['Such mirror Similarity already exists.']}},
+            {'index': 4, 'errors': {'non_field_errors': ['First and second Nodes cannot be the same.']}},
+            {'index': 5, 'errors': {'node_one': ['The Root category cannot be a node.']}},
+        ])
+        self.assertEqual(Similarity.objects.count(), 1)
+
+    def test_view_rest_similarity_bulk_update_and_delete(self):
+        similarity_1 = create_similarity(self.test_node_1, self.test_node_2)
+        similarity_2 = create_similarity(self.test_node_2, self.test_node_3)
+
+        data = [{'id': similarity_1.id, 'node_two': self.test_node_3.id}, {'id': similarity_2.id, 'node_one': 0}]
+        response = self.bulk('/rest/similarities/bulk/', 'patch', data)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['results'], [
+            {'index': 1, 'errors': {'node_one': ['Unknown category.']}},
+        ])
+
+        response = self.bulk('/rest/similarities/bulk/', 'patch', data[:1])
+        self.assertEqual(response.status_code, 200)
+        pair = Similarity.objects.get(id=similarity_1.id).pair
+        self.assertEqual(pair, f'{self.test_node_1.id}-{self.test_node_3.id}')
+        self.assertEqual(Category.objects.get(id=self.test_node_2.id).island, self.test_node_1.id)
+
+        response = self.bulk('/rest/similarities/bulk/', 'delete', [similarity_2.id])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Category.objects.get(id=self.test_node_2.id).island, self.test_node_2.id)
+        self.assertEqual(Category.objects.get(id=self.test_node_3.id).island, self.test_node_1.id)
+
+
+class ViewsQueryCountTests(TestCase):
+    """
+    Every list and detail view issues a fixed number of queries, whatever
+    the number of categories and similarities
+    """
+    expected = {
+        'index': 5,
+        'category_list': 1,
+        'category_display': 3,
+        'category_update': 2,
+        'category_tree': 2,
+        'similarity_list': 1,
+        'similarity_display': 1,
+        'similarity_update': 4,
+        'rest_category_list': 1,
+        'rest_category_detail': 1,
+        'rest_similarity_list': 1,
+        'rest_similarity_detail': 1,
+    }
+
+    def populate(self, count):
+        root_node = create_category(Category.ROOT_NAME)
+        categories = [create_category(f'Category {i}', root_node) for i in range(1, count + 1)]
+        for node_one, node_two in zip(categories, categories[1:]):
+            node_two.parent = node_one
+            node_two.save()
+            create_similarity(node_one, node_two)
+        return root_node, categories[-1], Similarity.objects.first()
+
+    def get_links(self, count):
+        root_node, category, similarity = self.populate(count)
+        return {
+            'index': reverse('categories:index'),
+            'category_list': reverse('categories:category_list'),
+            'category_display': category.get_absolute_url(),
+            'category_update': reverse('categories:category_update', args=[category.id, category.slug]),
+            'category_tree': reverse('categories:category_tree', args=[root_node.id, root_node.slug]),
+            'similarity_list': reverse('categories:similarity_list'),
+            'similarity_display': similarity.get_absolute_url(),
+            'similarity_update': reverse('categories:similarity_update', args=[similarity.id]),
+            'rest_category_list': '/rest/categories/',
+            'rest_category_detail': f'/rest/categories/{category.id}/',
+            'rest_similarity_list': '/rest/similarities/',
+            'rest_similarity_detail': f'/rest/similarities/{similarity.id}/',
+        }
+
+    def assertQueryCounts(self, count):
+        for name, link in self.get_links(count).items():
+            with self.subTest(view=name, count=count), self.assertNumQueries(self.expected[name]):
+                response = self.client.get(link)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                self.assertEqual(response.status_code, 200)
+
+    def test_views_query_count_few_rows(self):
+        self.assertQueryCounts(3)
+
+    def test_views_query_count_many_rows(self):
+        self.assertQueryCounts(30)
+
+
+class ServerTimingTests(TestCase):
+
+    def setUp(self):
+        self.root_node = create_category(Category.ROOT_NAME)
+        self.test_node = create_category('T1', self.root_node)
+
+    def test_server_timing_disabled(self):
+        response = self.client.get(self.test_node.get_absolute_url())
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(CATEGORIES_SERVER_TIMING=True)
+    def test_server_timing_enabled(self):
+        with self.assertLogs('categories.timing', 'INFO') as logs:
+            response = self.client.get(self.test_node.get_absolute_url())
+
+        metrics = [it.split(';')[0] for it in response['Server-Timing'].split(', ')]
+        self.assertEqual(metrics, ['related', 'similarities', 'render', 'total'])
+        self.assertRegex(response['Server-Timing'], r'related;dur=[\d.]+;desc="1 queries"')
+        self.assertRegex(response['Server-Timing'], r'similarities;dur=[\d.]+;desc="1 queries"')
+        self.assertRegex(response['Server-Timing'], r'render;dur=[\d.]+;desc="0 queries"')
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['path'], self.test_node.get_absolute_url())
+        self.assertEqual(set(record['helpers']), set(metrics[:-1]))
@@ -1,8 +1,29 @@
 import os
+import shutil
+import tempfile
 
 from categories.models import Category, Similarity
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+
+
+class TemporaryMediaMixin:
+    """
+    Store the uploads of every test in a temporary MEDIA_ROOT, with the
+    image tasks run in place
+    """
+    media_settings = {}
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media_settings = override_settings(
+            MEDIA_ROOT=self.media_root, CATEGORIES_IMAGE_SYNC=True, **self.media_settings,
+        )
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
 
 
 def create_category(name, parent=None):
@@ -0,0 +1,82 @@
+import json
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+_timings = ContextVar('categories_timings', default=None)
+
+
+@contextmanager
+def timed(name):
+    """
+    Record the time and the queries spent in the block ( or the decorated
+    function ) under name - a no-op unless ServerTimingMiddleware is active
+    """
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+
+    queries = 0
+
+    def count(execute, sql, params, many, context):
+        nonlocal queries
+        queries += 1
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        with connection.execute_wrapper(count):
+            yield
+    finally:
+        duration, count_queries = timings.get(name, (0.0, 0))
+        timings[name] = (duration + time.perf_counter() - start, count_queries + queries)
+
+
+class ServerTimingMiddleware:
+    """
+    Emit the timings of the categories helpers as a Server-Timing header and
+    a structured log line - enabled by settings.CATEGORIES_SERVER_TIMING
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'CATEGORIES_SERVER_TIMING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _timings.set({})
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+            timings = _timings.get()
+        finally:
+            _timings.reset(token)
+        total = time.perf_counter() - start
+
+        metrics = [
+            f'{name};dur={duration * 1000:.1f};desc="{queries} queries"'
+            for name, (duration, queries) in timings.items()
+        ]
+        metrics.append(f'total;dur={total * 1000:.1f}')
+        response['Server-Timing'] = ', '.join(metrics)
+
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 1),
+            'helpers': {
+                name: {'ms': round(duration * 1000, 1), 'queries': queries}
+                for name, (duration, queries) in timings.items()
+            },
+        }))
+
+        return response
@@ -0,0 +1,229 @@
+import csv
+import json
+from collections import defaultdict, deque
+
+from categories.bulk import (
+    bulk_create_similarities,
+    bulk_insert_categories,
+    get_image_renditions,
+    render_images,
+)
+from categories.images import run_in_background
+from categories.models import Category, Similarity
+from categories.validators import check_category_description, clean_category_name, get_name_errors
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+TRANSFER_FORMATS = ['ndjson', 'csv']
+TRANSFER_FIELDS = [
+    'type', 'external_id', 'name', 'parent_external_id', 'description', 'image_ref', 'node_one', 'node_two',
+]
+
+
+def get_transfer_format(file_format=None, file_name=None):
+    """
+    Return the explicit format, or the one implied by the file extension
+    ( .csv, anything else being newline-delimited JSON )
+    """
+    if file_format:
+        if file_format not in TRANSFER_FORMATS:
+            raise ValueError(f'Unknown format "{file_format}" ( use {" or ".join(TRANSFER_FORMATS)} ).')
+        return file_format
+    return 'csv' if file_name and file_name.lower().endswith('.csv') else 'ndjson'
+
+
+# Export
+
+def export_records(chunk_size=2000):
+    """
+    Yield every non-root category as a record - in path order, so parents
+    always precede their children - and then every similarity, reading
+    both tables in chunks from server-side cursors
+    """
+    root_id = Category.objects.get_root_id()
+
+    categories = Category.objects.exclude(is_root=True).order_by('path')
+    categories = categories.values_list('id', 'name', 'parent_id', 'description', 'image')
+    for pk, name, parent_id, description, image in categories.iterator(chunk_size=chunk_size):
+        yield {
+            'type': 'category',
+            'external_id': str(pk),
+            'name': name,
+            'parent_external_id': '' if parent_id in (None, root_id) else str(parent_id),
+            'description': description,
+            'image_ref': image,
+        }
+
+    similarities = Similarity.objects.order_by('id').values_list('node_one_id', 'node_two_id')
+    for node_one, node_two in similarities.iterator(chunk_size=chunk_size):
+        yield {'type': 'similarity', 'node_one': str(node_one), 'node_two': str(node_two)}
+
+
+class Echo:
+    """
+    A file-like object that returns what is written to it, for csv.writer
+    """
+
+    def write(self, value):
+        return value
+
+
+def write_records(records, file_format):
+    """
+    Yield the records one line at a time
+    """
+    if file_format == 'csv':
+        writer = csv.DictWriter(Echo(), TRANSFER_FIELDS, restval='')
+        yield writer.writeheader()
+        for record in records:
+            yield writer.writerow(record)
+    else:
+        for record in records:
+            yield json.dumps(record) + '\n'
+
+
+# Import
+
+def read_records(lines, file_format):
+    """
+    Yield ( line number, record ) pairs parsed from an iterable of text lines
+    """
+    if file_format == 'csv':
+        reader = csv.DictReader(lines)
+        for record in reader:
+            yield reader.line_num, record
+        return
+
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            raise ValueError(f'Line {number}: invalid JSON.')
+        if not isinstance(record, dict):
+            raise ValueError(f'Line {number}: a record must be a JSON object.')
+        yield number, record
+
+
+def import_records(records, batch_size=1000):
+    """
+    Insert the categories and similarities of the records in one
+    transaction and return their counts
+
+    Categories refer to their parents ( and similarities to their nodes )
+    by external id, so the rows are inserted in topological order and
+    linked by the ids the database assigns - an empty parent means the Root
+    node. A ValueError names the first invalid record and nothing is
+    inserted.
+    """
+    root_node = Category.objects.get_root()
+    if root_node is None:
+        raise ValueError('Create the Root category first.')
+
+    categories, pairs = parse_records(records)
+    order = sort_categories(categories)
+
+    with transaction.atomic():
+        check_slugs(categories)
+        renditions = get_image_renditions({it['image_ref'] for it in categories.values()})
+
+        indexes = {external_id: index for index, external_id in enumerate(order)}
+        inserted = [
+            Category(
+                name=categories[external_id]['name'],
+                description=categories[external_id]['description'],
+                image=categories[external_id]['image_ref'],
+                renditions=renditions.get(categories[external_id]['image_ref']) or {},
+                parent_id=root_node.id,
+            )
+            for external_id in order
+        ]
+        parents = [indexes.get(categories[external_id]['parent_external_id']) for external_id in order]
+        bulk_insert_categories(inserted, parents, batch_size)
+
+        ids = {external_id: category.id for external_id, category in zip(order, inserted)}
+        similarities = [Similarity(node_one_id=ids[one], node_two_id=ids[two]) for one, two in pairs]
+        bulk_create_similarities(similarities, batch_size)
+
+        missing = {it['image_ref'] for it in categories.values()} - set(renditions)
+        if missing:
+            transaction.on_commit(lambda: run_in_background(render_images, sorted(missing)))
+
+    return len(order), len(similarities)
+
+
+def parse_records(records):
+    categories = {}
+    pairs = {}
+    for number, record in records:
+        record_type = record.get('type') or 'category'
+        if record_type == 'category':
+            category = parse_category(number, record)
+            if category['external_id'] in categories:
+                raise ValueError(f'Line {number}: duplicate external id "{category["external_id"]}".')
+            categories[category['external_id']] = category
+        elif record_type == 'similarity':
+            node_one, node_two = str(record.get('node_one') or ''), str(record.get('node_two') or '')
+            pair = frozenset([node_one, node_two])
+            if len(pair) < 2:
+                raise ValueError(f'Line {number}: a similarity needs two different nodes.')
+            if pair in pairs:
+                raise ValueError(f'Line {number}: duplicate similarity {node_one} - {node_two}.')
+            pairs[pair] = (number, node_one, node_two)
+        else:
+            raise ValueError(f'Line {number}: unknown record type "{record_type}".')
+
+    for number, node_one, node_two in pairs.values():
+        for node in [node_one, node_two]:
+            if node not in categories:
+                raise ValueError(f'Line {number}: unknown similarity node "{node}".')
+
+    return categories, [(node_one, node_two) for number, node_one, node_two in pairs.values()]
+
+
+def parse_category(number, record):
+    category = {it: str(record.get(it) or '').strip() for it in TRANSFER_FIELDS[1:6]}
+
+    if not category['external_id']:
+        raise ValueError(f'Line {number}: the external id is missing.')
+    if not category['image_ref']:
+        raise ValueError(f'Line {number}: the image reference is missing.')
+    try:
+        category['name'] = clean_category_name(category['name'])
+        check_category_description(category['description'])
+    except ValidationError as error:
+        raise ValueError(f'Line {number}: {error.messages[0]}')
+    category['line'] = number
+    return category
+
+
+def sort_categories(categories):
+    """
+    Return the external ids with every parent before its children
+    """
+    children = defaultdict(list)
+    for external_id, category in categories.items():
+        parent = category['parent_external_id']
+        if parent and parent not in categories:
+            raise ValueError(f'Line {category["line"]}: unknown parent "{parent}".')
+        children[parent].append(external_id)
+
+    order = []
+    queue = deque(children[''])
+    while queue:
+        external_id = queue.popleft()
+        order.append(external_id)
+        queue.extend(children[external_id])
+
+    if len(order) < len(categories):
+        cycle = min(set(categories) - set(order), key=lambda it: categories[it]['line'])
+        raise ValueError(f'Line {categories[cycle]["line"]}: "{cycle}" is part of a parent cycle.')
+    return order
+
+
+def check_slugs(categories):
+    errors = get_name_errors({it['line']: it['name'] for it in categories.values()})
+    if errors:
+        line = min(errors)
+        raise ValueError(f'Line {line}: {errors[line]}')
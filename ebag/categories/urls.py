@@ -8,7 +8,9 @@ urlpatterns = [
     path('access-denied', views.access_denied, name='access_denied'),
     path('category-list/', views.CategoryList.as_view(), name='category_list'),
     path('category-create/', views.category_manage, name='category_create'),
+    path('category-search/', views.category_search, name='category_search'),
     path('category/<int:pk>/<slug:slug>/', views.CategoryDisplay.as_view(), name='category_display'),
+    path('category/<int:pk>/<slug:slug>/tree/', views.category_tree, name='category_tree'),
     path('category/<int:pk>/<slug:slug>/update/', views.category_manage, name='category_update'),
     path('category/<int:pk>/<slug:slug>/delete/', views.CategoryDelete.as_view(), name='category_delete'),
     path('similarity-list/', views.SimilarityList.as_view(), name='similarity_list'),
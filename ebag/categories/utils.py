@@ -1,6 +1,53 @@
-import json
+import threading
+from array import array
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from functools import wraps
+from uuid import uuid4
 
-from categories.models import Category, Similarity
+from categories.models import Category, Similarity, get_subtree_filter
+from categories.timing import timed
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.urls import reverse
+from django.utils.html import format_html
+from django.utils.text import slugify
+
+CATEGORY_GRAPH_VERSION_KEY = 'categories:graph:version'
+INDENT = '&nbsp;' * 4
+
+
+def get_category_graph_version():
+    return cache.get_or_set(CATEGORY_GRAPH_VERSION_KEY, uuid4().hex, None)
+
+
+def bump_category_graph_version():
+    """
+    Invalidate the cached trees and islands right away, for the writing
+    transaction itself, and again once it commits - whatever a concurrent
+    reader cached in between from rows not yet committed ( or not yet fully
+    updated ) is dropped with the second version
+    """
+    cache.set(CATEGORY_GRAPH_VERSION_KEY, uuid4().hex, None)
+    transaction.on_commit(lambda: cache.set(CATEGORY_GRAPH_VERSION_KEY, uuid4().hex, None))
+
+
+def cached_by_category_graph(function):
+    """
+    Cache the result per node until any Category or Similarity is changed
+    """
+    @wraps(function)
+    def wrapper(node):
+        key = f'categories:{function.__name__}:{get_category_graph_version()}:{node.id}'
+        value = cache.get(key)
+        if value is None:
+            value = function(node)
+            cache.set(key, value)
+        return value
+
+    return wrapper
 
 
 class Graph:
@@ -10,68 +57,295 @@ class Graph:
 
     def __init__(self, vertex):
         self.vertex = vertex
-        self.matrix = [[] * i for i in range(vertex)]
+        self.edges_from = array('I')
+        self.edges_to = array('I')
 
     def add_edge(self, x, y):
-        self.matrix[x].append(y)
-        self.matrix[y].append(x)
+        self.edges_from.append(x)
+        self.edges_to.append(y)
+
+    def adjacency(self):
+        """
+        Build the CSR ( compressed sparse row ) adjacency - the neighbours of
+        vertex v are targets[offsets[v]:offsets[v + 1]] in insertion order
+        """
+        offsets = array('I', bytes(4 * (self.vertex + 1)))
+        for x, y in zip(self.edges_from, self.edges_to):
+            offsets[x + 1] += 1
+            offsets[y + 1] += 1
+        for vertex in range(self.vertex):
+            offsets[vertex + 1] += offsets[vertex]
 
-    def dfs_util(self, temporary, vertex, visited):
-        visited[vertex] = True
-        temporary.append(vertex)
-        for i in self.matrix[vertex]:
-            if not visited[i]:
-                temporary = self.dfs_util(temporary, i, visited)
-        return temporary
+        position = array('I', offsets)
+        targets = array('I', bytes(4 * offsets[self.vertex]))
+        for x, y in zip(self.edges_from, self.edges_to):
+            targets[position[x]] = y
+            position[x] += 1
+            targets[position[y]] = x
+            position[y] += 1
+
+        return offsets, targets
 
     def connected_components(self):
-        visited = []
+        offsets, targets = self.adjacency()
+        visited = bytearray(self.vertex)
         connected = []
-        for i in range(self.vertex):
-            visited.append(False)
+
+        stack = array('I')
+        cursor = array('I')
         for vertex in range(self.vertex):
-            if not visited[vertex]:
-                temporary = []
-                connected.append(self.dfs_util(temporary, vertex, visited))
+            if visited[vertex]:
+                continue
+            visited[vertex] = True
+            temporary = [vertex]
+            stack.append(vertex)
+            cursor.append(offsets[vertex])
+            while stack:
+                current = stack[-1]
+                index = cursor[-1]
+                if index == offsets[current + 1]:
+                    stack.pop()
+                    cursor.pop()
+                    continue
+                cursor[-1] = index + 1
+                child = targets[index]
+                if not visited[child]:
+                    visited[child] = True
+                    temporary.append(child)
+                    stack.append(child)
+                    cursor.append(offsets[child])
+            connected.append(temporary)
+
         return connected
 
 
-def get_category_islands(node, by_type):
-    indexes = []
-    for category in Category.objects.exclude(name=Category.ROOT_NAME):
-        indexes.append(node_to_string(category, by_type))
+_maintenance = threading.local()
 
-    graph = Graph(len(indexes))
 
-    for similarity in Similarity.objects.select_related().all():
-        graph.add_edge(
-            indexes.index(node_to_string(similarity.node_one, by_type)),
-            indexes.index(node_to_string(similarity.node_two, by_type)),
-        )
+@contextmanager
+def defer_category_maintenance(rebuild=True):
+    """
+    Skip the per-row maintenance of the derived Category columns ( e.g. on
+    bulk deletes ) and rebuild them once on exit - or leave fixing them to
+    the caller with rebuild=False
+    """
+    _maintenance.deferred = getattr(_maintenance, 'deferred', 0) + 1
+    try:
+        yield
+    finally:
+        _maintenance.deferred -= 1
+        if not _maintenance.deferred and rebuild:
+            rebuild_category_paths()
+            rebuild_category_islands()
+            bump_category_graph_version()
+
+
+def is_category_maintenance_deferred():
+    return bool(getattr(_maintenance, 'deferred', 0))
+
+
+def rebuild_category_paths():
+    children = defaultdict(list)
+    categories = {}
+    for category in Category.objects.only('id', 'parent_id', 'path', 'depth'):
+        children[category.parent_id].append(category.id)
+        categories[category.id] = category
+
+    changed = []
+    queue = deque((pk, '/', 0) for pk in children[None])
+    while queue:
+        pk, parent_path, depth = queue.popleft()
+        category = categories[pk]
+        path = f'{parent_path}{pk}/'
+        if (category.path, category.depth) != (path, depth):
+            category.path, category.depth = path, depth
+            changed.append(category)
+        queue.extend((child, path, depth + 1) for child in children[pk])
+
+    Category.objects.bulk_update(changed, ['path', 'depth'], batch_size=1000)
+
+
+class DisjointSet:
+    """
+    Define connected components via union-find ( path compression and union by rank ).
+    """
 
-    category_islands = graph.connected_components()
+    def __init__(self, items):
+        self.parent = {item: item for item in items}
+        self.rank = dict.fromkeys(self.parent, 0)
+
+    def find(self, item):
+        root = item
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[item] != root:
+            self.parent[item], item = root, self.parent[item]
+        return root
+
+    def union(self, x, y):
+        x, y = self.find(x), self.find(y)
+        if x == y:
+            return
+        if self.rank[x] < self.rank[y]:
+            x, y = y, x
+        self.parent[y] = x
+        if self.rank[x] == self.rank[y]:
+            self.rank[x] += 1
+
+    def groups(self):
+        groups = defaultdict(list)
+        for item in self.parent:
+            groups[self.find(item)].append(item)
+        return list(groups.values())
 
-    for island in range(len(category_islands)):
-        for category in range(len(category_islands[island])):
-            index = category_islands[island][category]
-            category_islands[island][category] = indexes[index]
-        category_islands[island].sort()
 
-    category_islands.sort()
+def get_category_islands(node, by_type):
+    categories = Category.objects.exclude(is_root=True)
+    if not node.is_root:
+        categories = categories.filter(island__in=Category.objects.filter(id=node.id).values('island'))
+
+    return build_category_islands(categories.values_list('island', 'id', 'name', 'slug'), by_type)
+
 
-    if node.name != Category.ROOT_NAME:
-        category_islands = list(filter(lambda it: node_to_string(node, by_type) in it, category_islands))
+def build_category_islands(rows, by_type):
+    islands = defaultdict(list)
+    for island, pk, name, slug in rows:
+        islands[island].append(values_to_string(pk, name, slug, by_type))
+
+    category_islands = [sorted(island) for island in islands.values()]
+    category_islands.sort()
 
     return category_islands
 
 
+def merge_category_islands(node_one_id, node_two_id):
+    islands = set(Category.objects.filter(id__in=[node_one_id, node_two_id]).values_list('island', flat=True))
+    islands.discard(None)
+    if len(islands) == 2:
+        Category.objects.filter(island=max(islands)).update(island=min(islands))
+
+
+def merge_category_islands_many(pairs, batch_size=500):
+    """
+    Merge the islands joined by many new similarities at once
+    """
+    nodes = list({pk for pair in pairs for pk in pair})
+    islands = {}
+    for i in range(0, len(nodes), batch_size):
+        categories = Category.objects.filter(id__in=nodes[i:i + batch_size]).exclude(island=None)
+        islands.update(categories.values_list('id', 'island'))
+
+    merged = DisjointSet(set(islands.values()))
+    for node_one, node_two in pairs:
+        if node_one in islands and node_two in islands:
+            merged.union(islands[node_one], islands[node_two])
+
+    for group in merged.groups():
+        label = min(group)
+        group = [it for it in group if it != label]
+        for i in range(0, len(group), batch_size):
+            Category.objects.filter(island__in=group[i:i + batch_size]).update(island=label)
+
+
+def split_category_island(island, batch_size=500):
+    """
+    Recompute the components of a single island after one of its edges is
+    gone and relabel each part by its smallest category id
+    """
+    members = list(Category.objects.filter(island=island).values_list('id', flat=True))
+    indexes = {pk: index for index, pk in enumerate(members)}
+
+    graph = Graph(len(members))
+    edges = Similarity.objects.filter(node_one__island=island, node_two__island=island)
+    for node_one, node_two in edges.values_list('node_one_id', 'node_two_id'):
+        graph.add_edge(indexes[node_one], indexes[node_two])
+
+    for component in graph.connected_components():
+        component = [members[index] for index in component]
+        label = min(component)
+        if label == island:
+            continue
+        for i in range(0, len(component), batch_size):
+            Category.objects.filter(id__in=component[i:i + batch_size]).update(island=label)
+
+
+def rebuild_category_islands():
+    categories = {
+        category.id: category
+        for category in Category.objects.exclude(is_root=True).only('id', 'island')
+    }
+    islands = DisjointSet(categories)
+    for node_one, node_two in Similarity.objects.values_list('node_one_id', 'node_two_id'):
+        if node_one in categories and node_two in categories:
+            islands.union(node_one, node_two)
+
+    changed = []
+    for component in islands.groups():
+        label = min(component)
+        for pk in component:
+            if categories[pk].island != label:
+                categories[pk].island = label
+                changed.append(categories[pk])
+
+    Category.objects.bulk_update(changed, ['island'], batch_size=1000)
+
+
+@cached_by_category_graph
 def get_category_islands_to_string(node):
-    category_islands = get_category_islands(node, 'by_link')
-    category_islands = json.dumps(category_islands, indent=4)
-    category_islands = category_islands.replace(' ' * 4, '&nbsp;' * 4)
-    category_islands = category_islands.replace('"', '').replace(',', '')
+    return ''.join(render_category_islands(get_category_islands(node, 'by_link')))
 
-    return category_islands
+
+@cached_by_category_graph
+def get_category_context(node):
+    """
+    Build every section of the category display from two queries - one
+    for the ancestors, siblings, subtree and island members of the node
+    and one for its similarities - timed apart from the rendering
+    """
+    is_root = node.is_root
+    parent_ids = [int(it) for it in node.path.strip('/').split('/')[:-1]]
+
+    related = Q(id__in=parent_ids) | get_subtree_filter(node.path)
+    if node.parent_id:
+        related |= Q(parent_id=node.parent_id)
+    if not is_root and node.island is not None:
+        related |= Q(island=node.island)
+    fields = ['id', 'name', 'slug', 'parent_id', 'path', 'island', 'created_at']
+    with timed('related'):
+        categories = list(Category.objects.filter(related).only(*fields))
+
+    by_id = {it.id: it for it in categories}
+    children = defaultdict(list)
+    for category in categories:
+        if category.path.startswith(node.path) and category.id != node.id:
+            children[category.parent_id].append((category.id, category.parent_id, category.name, category.slug))
+
+    if is_root:
+        island = [it for it in categories if it.island is not None]
+    else:
+        island = [it for it in categories if it.island == node.island] or [node]
+    island = build_category_islands(((it.island, it.id, it.name, it.slug) for it in island), 'by_link')
+
+    siblings = []
+    if node.parent_id:
+        siblings = [it for it in categories if it.parent_id == node.parent_id and it.id != node.id]
+
+    with timed('similarities'):
+        similarities = Similarity.objects.filter(Q(node_one=node) | Q(node_two=node))
+        similarities = list(similarities.select_related('node_one', 'node_two'))
+
+    with timed('render'):
+        return {
+            'category_island': ''.join(render_category_islands(island)),
+            'category_nodes': [it for it in categories if it.parent_id == node.id],
+            'category_parents': [by_id[it] for it in parent_ids if it in by_id],
+            'category_siblings': siblings,
+            'category_similarities': (
+                [(it.node_two, it) for it in similarities if it.node_one_id == node.id]
+                + [(it.node_one, it) for it in similarities if it.node_two_id == node.id]
+            ),
+            'category_tree': ''.join(render_category_tree(build_category_tree(node, children, 'by_link'))),
+        }
 
 
 def get_category_nodes(node):
@@ -79,11 +353,11 @@ def get_category_nodes(node):
 
 
 def get_category_parents(node):
-    parents = []
-    while node.parent:
-        parents.append(node.parent)
-        node = node.parent
-    return parents[::-1]
+    ids = [int(it) for it in node.path.strip('/').split('/')[:-1]]
+    if not ids:
+        return []
+    parents = Category.objects.in_bulk(ids)
+    return [parents[it] for it in ids if it in parents]
 
 
 def get_category_siblings(node):
@@ -93,43 +367,151 @@ def get_category_siblings(node):
 
 
 def get_category_similarities(node):
-    list_one = list(map(lambda it: (it.node_two, it), node.related_node_one.all()))
-    list_two = list(map(lambda it: (it.node_one, it), node.related_node_two.all()))
+    similarities = Similarity.objects.select_related('node_one', 'node_two')
+    list_one = list(map(lambda it: (it.node_two, it), similarities.filter(node_one=node)))
+    list_two = list(map(lambda it: (it.node_one, it), similarities.filter(node_two=node)))
     return list_one + list_two
 
 
+def get_category_children_map(node):
+    children = defaultdict(list)
+    subtree = Category.objects.filter(get_subtree_filter(node.path))
+    for row in subtree.values_list('id', 'parent_id', 'name', 'slug'):
+        children[row[1]].append(row)
+    return children
+
+
 def get_category_tree(node, by_type):
-    def get_next_depth(inner, level):
-        key = node_to_string(inner, by_type)
-        tree = {key: {}}
-        for child in Category.objects.filter(parent=inner.id):
-            tree[key].update(get_next_depth(child, level + 1))
-        return tree
+    return build_category_tree(node, get_category_children_map(node), by_type)
 
-    return get_next_depth(node, 0)
 
+def build_category_tree(node, children, by_type):
+    tree = {}
+    stack = [((node.id, node.parent_id, node.name, node.slug), tree)]
+    while stack:
+        (pk, _, name, slug), level = stack.pop()
+        key = values_to_string(pk, name, slug, by_type)
+        level[key] = {}
+        for child in reversed(children[pk]):
+            stack.append((child, level[key]))
+
+    return tree
+
+
+def get_category_subtree(node, depth, after=None, page_size=100):
+    """
+    Return the node with up to page_size children ( listed after the `after`
+    path ) and their descendants down to `depth` levels as nested dicts,
+    read in path order from a single query
+    """
+    child_count = Category.objects.filter(parent=OuterRef('pk')).order_by()
+    child_count = child_count.values('parent').annotate(count=Count('id')).values('count')
+
+    subtree = get_subtree_filter(node.path) & Q(depth__gt=node.depth, depth__lte=node.depth + depth)
+    if after:
+        subtree &= Q(path__gt=f'{after}~')
+    rows = Category.objects.filter(Q(id=node.id) | subtree).order_by('path')
+    rows = rows.annotate(child_count=Coalesce(Subquery(child_count), 0))
+
+    nodes = {}
+    children = 0
+    last_child = None
+    next_child = None
+    for row in rows.values('id', 'parent_id', 'name', 'path', 'depth', 'child_count').iterator():
+        if row['depth'] == node.depth + 1:
+            if children == page_size:
+                next_child = last_child
+                break
+            children += 1
+            last_child = row['path']
+
+        item = {'id': row['id'], 'name': row['name'], 'child_count': row['child_count']}
+        if row['depth'] < node.depth + depth:
+            item['children'] = []
+        if row['parent_id'] in nodes and row['id'] != node.id:
+            nodes[row['parent_id']]['children'].append(item)
+        nodes[row['id']] = item
+
+    return nodes[node.id], next_child
 
-def get_category_tree_nodes(node):
-    def get_next_depth(inner, level):
-        nodes = {inner.id}
-        for child in Category.objects.filter(parent=inner.id):
-            nodes.update(get_next_depth(child, level + 1))
-        return nodes
 
-    return get_next_depth(node, 0)
+def get_category_tree_nodes(node):
+    return set(Category.objects.filter(get_subtree_filter(node.path)).values_list('id', flat=True))
 
 
+@cached_by_category_graph
 def get_category_tree_to_string(node):
-    category_tree = get_category_tree(node, 'by_link')
-    category_tree = json.dumps(category_tree, sort_keys=True, indent=4)
-    category_tree = category_tree.replace(': {}', '').replace(' ' * 4, '&nbsp;' * 4)
-    category_tree = category_tree.replace('"', '').replace(',', '')
+    return ''.join(render_category_tree(get_category_tree(node, 'by_link')))
+
+
+def search_categories(query, after=None, page_size=20, exclude_tree=None, exclude_root=False):
+    """
+    Return up to page_size ( id, name, slug ) rows whose slug starts with
+    the slugified query, listed after the `after` slug, and the slug to
+    continue from ( or None )
+
+    The prefix is matched as a range on the unique slug index - '~' sorts
+    after every slug character. The subtree of exclude_tree is left out by
+    its path range, so that a node's own descendants are never offered as
+    its parent, and the Root node is left out by its flag with exclude_root
+    ( e.g. for similarities )
+    """
+    prefix = slugify(query)
+    categories = Category.objects.filter(slug__gte=prefix, slug__lt=prefix + '~').order_by('slug')
+    if after:
+        categories = categories.filter(slug__gt=after)
+    if exclude_tree is not None:
+        categories = categories.exclude(get_subtree_filter(exclude_tree.path))
+    if exclude_root:
+        categories = categories.exclude(is_root=True)
+
+    rows = list(categories.values_list('id', 'name', 'slug')[:page_size + 1])
+    return rows[:page_size], rows[page_size - 1][2] if len(rows) > page_size else None
+
+
+def render_category_islands(category_islands, newline='\n'):
+    """
+    Yield the islands in the indented layout, without building the whole string
+    """
+    if not category_islands:
+        yield '[]'
+        return
+
+    yield '['
+    for island in category_islands:
+        yield f'{newline}{INDENT}['
+        for node in island:
+            yield f'{newline}{INDENT * 2}{node}'
+        yield f'{newline}{INDENT}]'
+    yield f'{newline}]'
+
 
-    return category_tree
+def render_category_tree(category_tree, newline='\n'):
+    """
+    Yield the tree in the indented layout, walking it once and without recursion
+    """
+    yield '{'
+    stack = [iter(sorted(category_tree.items()))]
+    while stack:
+        level = len(stack)
+        for key, children in stack[-1]:
+            if children:
+                yield f'{newline}{INDENT * level}{key}: {{'
+                stack.append(iter(sorted(children.items())))
+                break
+            yield f'{newline}{INDENT * level}{key}'
+        else:
+            stack.pop()
+            yield f'{newline}{INDENT * (level - 1)}}}'
 
 
 def node_to_string(node, by_type):
+    return values_to_string(node.id, node.name, node.slug, by_type)
+
+
+def values_to_string(pk, name, slug, by_type):
     if by_type == 'by_name':
-        return node.name
+        return name
     elif by_type == 'by_link':
-        return f"<a href='{node.get_absolute_url()}'>{node.name}</a>"
+        url = reverse('categories:category_display', args=[pk, slug])
+        return format_html("<a href='{}'>{}</a>", url, name)
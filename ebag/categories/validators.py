@@ -0,0 +1,90 @@
+import re
+
+from categories.models import Category, Similarity
+from django.core.exceptions import ValidationError
+from django.utils.text import slugify
+
+
+def clean_category_name(name):
+    """
+    Collapse the whitespace of a category name and check it - the Root
+    node is only created by reset_db, so its name is never accepted
+    """
+    name = re.sub(r'\s+', ' ', str(name or '')).strip()
+    if not re.search(r'^[ _a-zA-Z0-9-]+$', name):
+        raise ValidationError('The Name must be Alphanumeric.')
+    if slugify(name) == Category.ROOT_NAME:
+        raise ValidationError('The Root category cannot be created or renamed.')
+    return name
+
+
+def check_category_description(description):
+    if len(description) > Category._meta.get_field('description').max_length:
+        raise ValidationError('The description is too long.')
+
+
+def check_category_parent(category, parent):
+    """
+    A move under the category itself or one of its descendants would cut
+    the subtree from the tree
+    """
+    if category is not None and category.path and parent.path.startswith(category.path):
+        raise ValidationError(Category.MOVE_ERROR)
+
+
+def get_name_errors(names, ids=None, batch_size=500):
+    """
+    Return {index: message} for the names ( {index: name} ) taken by an
+    earlier name or by an existing category other than ids[index] - the
+    slugs are looked up in `slug__in` batches
+    """
+    ids = ids or {}
+    errors, indexes = {}, {}
+    for index, name in names.items():
+        slug = slugify(name)
+        if slug in indexes:
+            errors[index] = 'Category with this Name already exists.'
+        else:
+            indexes[slug] = index
+
+    slugs = list(indexes)
+    for i in range(0, len(slugs), batch_size):
+        for slug, pk in Category.objects.filter(slug__in=slugs[i:i + batch_size]).values_list('slug', 'id'):
+            if pk != ids.get(indexes[slug]):
+                errors[indexes[slug]] = 'Category with this Name already exists.'
+    return errors
+
+
+def get_pair_errors(pairs, ids=None, batch_size=500):
+    """
+    Return {index: message} for the pairs ( {index: (node_one, node_two)}
+    of category ids ) of a node with itself or duplicating an earlier pair
+    or an existing similarity other than ids[index] - similar or mirror -
+    looked up in `pair__in` batches
+    """
+    ids = ids or {}
+    errors, indexes = {}, {}
+    for index, (node_one, node_two) in pairs.items():
+        if node_one == node_two:
+            errors[index] = 'First and second Nodes cannot be the same.'
+            continue
+        pair = Similarity.get_pair(node_one, node_two)
+        if pair in indexes:
+            errors[index] = get_duplicate_pair_error(node_one, pairs[indexes[pair]][0])
+        else:
+            indexes[pair] = index
+
+    keys = list(indexes)
+    for i in range(0, len(keys), batch_size):
+        existing = Similarity.objects.filter(pair__in=keys[i:i + batch_size]).values_list('pair', 'id', 'node_one_id')
+        for pair, pk, node_one in existing:
+            index = indexes[pair]
+            if pk != ids.get(index):
+                errors[index] = get_duplicate_pair_error(pairs[index][0], node_one)
+    return errors
+
+
+def get_duplicate_pair_error(node_one, existing_node_one):
+    if node_one == existing_node_one:
+        return 'Such similar Similarity already exists.'
+    return 'Such mirror Similarity already exists.'
@@ -1,35 +1,59 @@
+import base64
+import codecs
+import re
+
+from categories.batch import CategoryBatch, SimilarityBatch
 from categories.forms import CategoryManage, SimilarityManage
 from categories.models import Category, Similarity
-from categories.serializers import CategorySerializer, SimilaritySerializer
+from categories.pagination import CreatedAtCursorPagination
+from categories.serializers import (
+    CategoryPrimaryKeySerializer,
+    CategorySerializer,
+    SimilarityPrimaryKeySerializer,
+    SimilaritySerializer,
+)
+from categories.timing import timed
+from categories.transfer import export_records, get_transfer_format, import_records, read_records, write_records
 from categories.utils import (
+    get_category_context,
     get_category_islands_to_string,
-    get_category_nodes,
-    get_category_parents,
-    get_category_siblings,
-    get_category_similarities,
+    get_category_subtree,
+    get_category_tree,
     get_category_tree_to_string,
+    render_category_tree,
+    search_categories,
 )
+from django.db import transaction
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse_lazy
 from django.views import generic
 from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.parsers import FormParser, MultiPartParser
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 def index(request):
     root_name = Category.ROOT_NAME
-    category_count = Category.objects.exclude(name=root_name).count()
+    category_count = Category.objects.exclude(is_root=True).count()
     similarity_count = Similarity.objects.count()
 
     category_root_tree = ''
     category_root_islands = ''
 
-    if Category.objects.filter(name=root_name).exists():
-        root_node = Category.objects.get(name=root_name)
-        category_root_tree = get_category_tree_to_string(root_node)
-        category_root_islands = get_category_islands_to_string(root_node)
+    root_node = Category.objects.get_root()
+    if root_node is not None:
+        with timed('tree'):
+            category_root_tree = get_category_tree_to_string(root_node)
+        with timed('islands'):
+            category_root_islands = get_category_islands_to_string(root_node)
 
     context = {
         'root_name': root_name,
+        'root_node': root_node,
         'category_count': category_count,
         'similarity_count': similarity_count,
         'category_root_tree': category_root_tree,
@@ -60,7 +84,7 @@ def category_manage(request, pk=None, slug=None):
     }
 
     if form.is_valid():
-        if category and category.name == Category.ROOT_NAME:
+        if category and category.is_root:
             return redirect('categories:access_denied')
         category = form.save()
         return redirect(category)
@@ -68,7 +92,7 @@ def category_manage(request, pk=None, slug=None):
 
 
 class CategoryList(generic.ListView):
-    queryset = Category.objects.exclude(name=Category.ROOT_NAME)
+    queryset = Category.objects.exclude(is_root=True).select_related('parent')
     context_object_name = 'category_list'
 
 
@@ -77,22 +101,54 @@ class CategoryDisplay(generic.DetailView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['category_island'] = get_category_islands_to_string(self.object)
-        context['category_nodes'] = get_category_nodes(self.object)
-        context['category_parents'] = get_category_parents(self.object)
-        context['category_siblings'] = get_category_siblings(self.object)
-        context['category_similarities'] = get_category_similarities(self.object)
-        context['category_tree'] = get_category_tree_to_string(self.object)
+        context.update(get_category_context(self.object))
+        if context['category_parents']:
+            self.object.parent = context['category_parents'][-1]
         return context
 
 
+def category_tree(request, pk, slug=None):
+    category = get_object_or_404(Category, id=pk)
+    category_tree = get_category_tree(category, 'by_link')
+    return StreamingHttpResponse(render_category_tree(category_tree, newline='<br>'))
+
+
+def category_search(request):
+    """
+    JSON choices for the autocomplete widgets: `q` is matched as a slug
+    prefix, `after` continues from the `next` slug of the previous page,
+    `exclude` leaves out the subtree of the given category and `root=0`
+    leaves out the Root node
+    """
+    exclude_tree = None
+    if request.GET.get('exclude', '').isdigit():
+        exclude_tree = get_object_or_404(Category, id=request.GET['exclude'])
+
+    try:
+        page_size = min(max(int(request.GET.get('page_size', 20)), 1), 100)
+    except ValueError:
+        page_size = 20
+
+    rows, next_after = search_categories(
+        request.GET.get('q', ''),
+        request.GET.get('after'),
+        page_size,
+        exclude_tree=exclude_tree,
+        exclude_root=request.GET.get('root') == '0',
+    )
+    return JsonResponse({
+        'results': [{'id': pk, 'text': name} for pk, name, slug in rows],
+        'next': next_after,
+    })
+
+
 class CategoryDelete(generic.edit.DeleteView):
     model = Category
     template_name = 'categories/category_delete.html'
     success_url = reverse_lazy('categories:index')
 
     def post(self, request, *args, **kwargs):
-        if self.get_object().name == Category.ROOT_NAME:
+        if self.get_object().is_root:
             return redirect('categories:access_denied')
         return super().post(request, *args, **kwargs)
 
@@ -107,7 +163,7 @@ def similarity_manage(request, pk=None):
 
     form = SimilarityManage(request.POST or None, instance=similarity)
 
-    category_count = Category.objects.exclude(name=Category.ROOT_NAME).count()
+    category_count = Category.objects.exclude(is_root=True).count()
 
     context = {
         'pk': pk,
@@ -123,11 +179,11 @@ def similarity_manage(request, pk=None):
 
 
 class SimilarityList(generic.ListView):
-    model = Similarity
+    queryset = Similarity.objects.select_related('node_one', 'node_two')
 
 
 class SimilarityDisplay(generic.DetailView):
-    model = Similarity
+    queryset = Similarity.objects.select_related('node_one', 'node_two')
 
 
 class SimilarityDelete(generic.edit.DeleteView):
@@ -138,11 +194,118 @@ class SimilarityDelete(generic.edit.DeleteView):
 
 # REST ViewSets
 
-class CategoryViewSet(viewsets.ModelViewSet):
+def get_int_param(request, name, default, maximum):
+    try:
+        value = int(request.query_params.get(name, default))
+    except ValueError:
+        value = default
+    return min(max(value, 1), maximum)
+
+
+class PrimaryKeyModeMixin:
+    """
+    Serialize relations as plain primary keys on `?relations=pk`
+    """
+    primary_key_serializer_class = None
+
+    def get_serializer_class(self):
+        if self.request.query_params.get('relations') == 'pk':
+            return self.primary_key_serializer_class
+        return super().get_serializer_class()
+
+
+class BulkActionMixin:
+    """
+    Create ( POST ), update ( PATCH ) or delete ( DELETE ) a list of items
+    at `bulk/` in one transaction - the results are reported per item
+    index, with the ids written or the errors of the invalid items
+    """
+    batch_class = None
+
+    @action(detail=False, methods=['post', 'patch', 'delete'], url_path='bulk')
+    def bulk(self, request):
+        with transaction.atomic():
+            batch = self.batch_class(request.method, request.data)
+            if not batch.is_valid():
+                return Response({'results': batch.results}, status=400)
+            results = batch.save()
+        return Response({'results': results}, status=201 if request.method == 'POST' else 200)
+
+
+class CategoryViewSet(BulkActionMixin, PrimaryKeyModeMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
-
-
-class SimilarityViewSet(viewsets.ModelViewSet):
-    queryset = Similarity.objects.all()
+    primary_key_serializer_class = CategoryPrimaryKeySerializer
+    pagination_class = CreatedAtCursorPagination
+    batch_class = CategoryBatch
+    tree_max_depth = 10
+    tree_page_size = 100
+
+    @action(detail=True)
+    def tree(self, request, pk=None):
+        category = self.get_object()
+
+        depth = get_int_param(request, 'depth', 1, self.tree_max_depth)
+        page_size = get_int_param(request, 'page_size', self.tree_page_size, self.tree_page_size)
+
+        after = None
+        cursor = request.query_params.get('cursor')
+        if cursor:
+            try:
+                after = base64.urlsafe_b64decode(cursor.encode()).decode()
+            except (ValueError, UnicodeDecodeError):
+                raise NotFound('Invalid cursor')
+            if not re.fullmatch(r'(/\d+)+/', after) or not after.startswith(category.path):
+                raise NotFound('Invalid cursor')
+
+        subtree, next_child = get_category_subtree(category, depth, after, page_size)
+
+        subtree['next'] = None
+        if next_child:
+            cursor = base64.urlsafe_b64encode(next_child.encode()).decode()
+            subtree['next'] = replace_query_param(request.build_absolute_uri(), 'cursor', cursor)
+
+        return Response(subtree)
+
+    @action(detail=False, url_path='export')
+    def export(self, request):
+        """
+        Stream every category and similarity as `?file_format=ndjson` ( the
+        default ) or `csv`
+        """
+        try:
+            file_format = get_transfer_format(request.query_params.get('file_format') or 'ndjson')
+        except ValueError as error:
+            raise ValidationError({'file_format': [str(error)]})
+
+        content_type = 'text/csv' if file_format == 'csv' else 'application/x-ndjson'
+        response = StreamingHttpResponse(write_records(export_records(), file_format), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="categories.{file_format}"'
+        return response
+
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser, FormParser])
+    def import_file(self, request):
+        """
+        Import the uploaded `file` ( its format is taken from `file_format`
+        or the file extension ) in one transaction
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            raise ValidationError({'file': ['No file was submitted.']})
+
+        try:
+            file_format = get_transfer_format(request.data.get('file_format'), upload.name)
+            lines = codecs.iterdecode(upload, 'utf-8')
+            categories, similarities = import_records(read_records(lines, file_format))
+        except ValueError as error:
+            raise ValidationError({'file': [str(error)]})
+
+        return Response({'categories': categories, 'similarities': similarities}, status=201)
+
+
+class SimilarityViewSet(BulkActionMixin, PrimaryKeyModeMixin, viewsets.ModelViewSet):
+    queryset = Similarity.objects.select_related('node_one', 'node_two')
     serializer_class = SimilaritySerializer
+    primary_key_serializer_class = SimilarityPrimaryKeySerializer
+    pagination_class = CreatedAtCursorPagination
+    batch_class = SimilarityBatch
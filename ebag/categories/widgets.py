@@ -0,0 +1,50 @@
+from urllib.parse import urlencode
+
+from django import forms
+from django.urls import reverse
+
+
+class AutocompleteSelect(forms.Select):
+    """
+    Render only the selected option(s) of a model choice field and let the
+    browser fetch the others from a JSON search endpoint, instead of one
+    <option> per row of the queryset
+    """
+    class Media:
+        js = ['categories/js/autocomplete.js']
+
+    def __init__(self, url_name, params=None, attrs=None):
+        super().__init__(attrs)
+        self.url_name = url_name
+        self.params = params or {}
+
+    def __deepcopy__(self, memo):
+        obj = super().__deepcopy__(memo)
+        obj.params = self.params.copy()
+        return obj
+
+    def get_url(self):
+        url = reverse(self.url_name)
+        return f'{url}?{urlencode(self.params)}' if self.params else url
+
+    def get_context(self, name, value, attrs):
+        attrs = {**(attrs or {}), 'data-autocomplete-url': self.get_url()}
+        return super().get_context(name, value, attrs)
+
+    def optgroups(self, name, value, attrs=None):
+        """
+        Keep the empty choice and look up the selected values alone, which
+        is one query on the primary key whatever the size of the queryset
+        """
+        field = self.choices.field
+        choices = [('', field.empty_label)] if field.empty_label is not None else []
+        values = [it for it in value if it.isdigit()]
+        if values:
+            choices += [self.choices.choice(it) for it in self.choices.queryset.filter(pk__in=values)]
+
+        groups = []
+        for index, (option_value, option_label) in enumerate(choices):
+            selected = str(option_value) in value
+            option = self.create_option(name, option_value, option_label, selected, index, attrs=attrs)
+            groups.append((None, [option], index))
+        return groups
@@ -41,6 +41,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'categories.timing.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -50,6 +51,26 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Emit Server-Timing headers and log lines for the categories helpers
+CATEGORIES_SERVER_TIMING = False
+
+# Resized renditions of Category.image, generated in a pool of worker threads
+CATEGORIES_IMAGE_WIDTHS = [320, 640, 1280]
+CATEGORIES_IMAGE_FORMATS = ['webp', 'jpeg']
+CATEGORIES_IMAGE_WORKERS = 2
+CATEGORIES_IMAGE_SYNC = False
+
+# Released images saved more recently than this ( in seconds ) are kept, as a concurrent upload may reuse them
+CATEGORIES_IMAGE_RELEASE_GRACE = 600
+
+# Uploaded images are checked from their header against these limits
+CATEGORIES_IMAGE_MAX_BYTES = 20 * 1024 * 1024
+CATEGORIES_IMAGE_MAX_PIXELS = 40_000_000
+CATEGORIES_IMAGE_ALLOWED_FORMATS = ['JPEG', 'PNG', 'WEBP', 'GIF']
+
+# Spool every upload to a temporary file instead of memory
+FILE_UPLOAD_HANDLERS = ['django.core.files.uploadhandler.TemporaryFileUploadHandler']
+
 ROOT_URLCONF = 'ebag.urls'
 
 TEMPLATES = [
@@ -80,6 +101,24 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+# The category graph version key must be shared by every worker process,
+# or a worker keeps serving its cached tree after another one has changed it -
+# use Redis / Memcached instead when the workers run on more than one host
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+        'TIMEOUT': 3600,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    }
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 